@@ -0,0 +1,157 @@
+import json
+import queue
+import logging
+import unittest
+from flask import Flask
+from service.log_pipeline import (
+    DroppingQueueHandler,
+    JsonFormatter,
+    SamplingFilter,
+    configure_logging,
+    dropped_records,
+)
+
+
+class ListHandler(logging.Handler):
+    """Keeps the formatted records it is given"""
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+class TestLogPipeline(unittest.TestCase):
+    """Test Cases for the queued logging pipeline"""
+
+    def setUp(self):
+        """This runs before each test"""
+        self.app = Flask("log_pipeline_test")
+        self.app.logger.handlers.clear()
+        self.handler = ListHandler()
+        self.app.logger.addHandler(self.handler)
+        self.app.logger.propagate = False
+        self.app.logger.setLevel(logging.INFO)
+
+        @self.app.route("/hot")
+        def hot():
+            self.app.logger.info("hot path")
+            return ""
+
+        @self.app.route("/fail")
+        def fail():
+            try:
+                raise ValueError("no such product")
+            except ValueError:
+                self.app.logger.exception("lookup failed")
+            return ""
+
+        @self.app.route("/cold")
+        def cold():
+            self.app.logger.info("cold path")
+            self.app.logger.warning("cold warning")
+            return ""
+
+    def _configure(self, **config):
+        self.app.config.update(config)
+        listener = configure_logging(self.app)
+        self.addCleanup(listener.stop)
+        return listener
+
+    def test_records_go_through_the_queue(self):
+        """It should hand records to the original handlers on another thread"""
+        listener = self._configure(LOG_LEVEL="DEBUG")
+        self.assertNotIn(self.handler, self.app.logger.handlers)
+        self.app.logger.debug("Creating %s", "Hat")
+        listener.stop()
+        self.assertEqual(self.handler.lines, ["Creating Hat"])
+
+    def test_configure_once(self):
+        """It should build the pipeline only once per app"""
+        listener = self._configure()
+        self.assertIs(configure_logging(self.app), listener)
+        self.assertEqual(len(self.app.logger.handlers), 1)
+
+    def test_level_gates_arguments(self):
+        """It should not format the arguments of a disabled level"""
+
+        class Exploding:
+            def __str__(self):
+                raise AssertionError("formatted a disabled record")
+
+        listener = self._configure(LOG_LEVEL="INFO")
+        self.app.logger.debug("Processing: %s", Exploding())
+        listener.stop()
+        self.assertEqual(self.handler.lines, [])
+
+    def test_sampling_by_endpoint(self):
+        """It should sample INFO records per endpoint but keep warnings"""
+        listener = self._configure(LOG_SAMPLE_RATES={"hot": 0.0})
+        client = self.app.test_client()
+        for _ in range(5):
+            client.get("/hot")
+        client.get("/cold")
+        listener.stop()
+        self.assertEqual(self.handler.lines, ["cold path", "cold warning"])
+
+    def test_sampling_filter_rate(self):
+        """It should always keep warnings whatever the rate"""
+        sampling = SamplingFilter(rate=0.0)
+        info = logging.LogRecord("x", logging.INFO, __file__, 1, "info", None, None)
+        warning = logging.LogRecord("x", logging.WARNING, __file__, 1, "warn", None, None)
+        self.assertFalse(sampling.filter(info))
+        self.assertTrue(sampling.filter(warning))
+        self.assertTrue(SamplingFilter(rate=1.0).filter(info))
+
+    def test_full_queue_drops(self):
+        """It should drop and count records instead of blocking"""
+        handler = DroppingQueueHandler(queue.Queue(2))
+        logger = logging.getLogger("log_pipeline_test.dropping")
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        for number in range(5):
+            logger.warning("record %s", number)
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_dropped_records(self):
+        """It should report the records dropped by the app logger"""
+        self._configure(LOG_QUEUE_SIZE=1)
+        self.assertEqual(dropped_records(self.app), 0)
+
+    def test_json_format(self):
+        """It should write one JSON object per record with the endpoint"""
+        listener = self._configure(LOG_FORMAT="json")
+        self.app.test_client().get("/cold")
+        listener.stop()
+        entries = [json.loads(line) for line in self.handler.lines]
+        self.assertEqual(entries[0]["message"], "cold path")
+        self.assertEqual(entries[0]["level"], "INFO")
+        self.assertEqual(entries[0]["endpoint"], "cold")
+        self.assertEqual(entries[1]["level"], "WARNING")
+        self.assertIsInstance(self.handler.formatter, JsonFormatter)
+
+    def test_json_format_exception(self):
+        """It should keep the traceback of a record for the listener to format"""
+        listener = self._configure(LOG_FORMAT="json")
+        self.app.test_client().get("/fail")
+        listener.stop()
+        entry = json.loads(self.handler.lines[0])
+        self.assertEqual(entry["message"], "lookup failed")
+        self.assertIn("ValueError: no such product", entry["exception"])
+
+    def test_arguments_snapshotted(self):
+        """It should log the arguments as they were when the record was made"""
+        listener = self._configure()
+        names = ["Hat"]
+        self.app.logger.info("Creating %s", names)
+        names.append("Cap")
+        listener.stop()
+        self.assertEqual(self.handler.lines, ["Creating ['Hat']"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from sqlalchemy import create_engine, exc, text
+from service.pool import LatencyHistogram, TimedQueuePool, configure_pool, pool_stats
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Test Cases for the connection pool settings and metrics"""
+
+    def setUp(self):
+        """This runs before each test"""
+        self.workdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            "sqlite:///" + os.path.join(self.workdir.name, "pool.db"),
+            poolclass=TimedQueuePool,
+            pool_size=2,
+            max_overflow=0,
+            pool_timeout=0.05,
+        )
+
+    def tearDown(self):
+        """This runs after each test"""
+        self.engine.dispose()
+        self.workdir.cleanup()
+
+    def test_engine_options(self):
+        """It should build the engine options from the DB_* settings"""
+        app = SimpleNamespace(config={
+            "SQLALCHEMY_DATABASE_URI": "postgresql://postgres@localhost/postgres",
+            "DB_POOL_SIZE": 20,
+            "DB_MAX_OVERFLOW": 5,
+            "DB_POOL_PRE_PING": True,
+            "DB_STATEMENT_TIMEOUT": 1500,
+            "SQLALCHEMY_ENGINE_OPTIONS": {"pool_timeout": 3},
+        })
+        configure_pool(app)
+        options = app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+        self.assertIs(options["poolclass"], TimedQueuePool)
+        self.assertEqual(options["pool_size"], 20)
+        self.assertEqual(options["max_overflow"], 5)
+        self.assertEqual(options["pool_timeout"], 3)
+        self.assertTrue(options["pool_pre_ping"])
+        self.assertEqual(options["connect_args"], {"options": "-c statement_timeout=1500"})
+
+    def test_engine_options_sqlite(self):
+        """It should leave the pool class of SQLite alone"""
+        app = SimpleNamespace(config={"SQLALCHEMY_DATABASE_URI": "sqlite://"})
+        configure_pool(app)
+        options = app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+        self.assertNotIn("poolclass", options)
+        self.assertNotIn("pool_size", options)
+        self.assertFalse(options["pool_pre_ping"])
+
+    def test_connections_in_use(self):
+        """It should report connections in use, idle and the saturation"""
+        first = self.engine.connect()
+        second = self.engine.connect()
+        stats = pool_stats(self.engine.pool)
+        self.assertEqual(stats["in_use"], 2)
+        self.assertEqual(stats["saturation"], 1.0)
+        self.assertEqual(stats["checkout_ms"]["count"], 2)
+
+        first.close()
+        second.close()
+        stats = pool_stats(self.engine.pool)
+        self.assertEqual(stats["in_use"], 0)
+        self.assertEqual(stats["idle"], 2)
+
+    def test_checkout_timeout(self):
+        """It should count checkouts that timed out on a saturated pool"""
+        connections = [self.engine.connect() for _ in range(2)]
+        self.assertRaises(exc.TimeoutError, self.engine.connect)
+        stats = pool_stats(self.engine.pool)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertGreaterEqual(stats["checkout_ms"]["max"], 50)
+        for connection in connections:
+            connection.close()
+
+    def test_figures_survive_dispose(self):
+        """It should keep the figures when the pool is recreated"""
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        self.engine.dispose()
+        self.assertEqual(pool_stats(self.engine.pool)["checkout_ms"]["count"], 1)
+
+    def test_histogram_percentiles(self):
+        """It should report percentiles as bucket bounds"""
+        histogram = LatencyHistogram(buckets=(1, 10, 100))
+        for latency in [0.5] * 98 + [50, 500]:
+            histogram.observe(latency)
+        self.assertEqual(histogram.percentile(0.5), 1)
+        self.assertEqual(histogram.percentile(0.99), 100)
+        self.assertEqual(histogram.percentile(1.0), 500)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 100)
+        self.assertEqual(snapshot["buckets"]["+Inf"], 1)
+
+    def test_stats_of_other_pools(self):
+        """It should describe pools that do not keep figures"""
+        engine = create_engine("sqlite://")
+        self.assertEqual(pool_stats(engine.pool)["pool"], type(engine.pool).__name__)
+
+
+if __name__ == "__main__":
+    unittest.main()
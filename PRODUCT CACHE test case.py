@@ -0,0 +1,101 @@
+import unittest
+from service.cache import CachedProduct, LocalSharedCache, LRUCache, ProductCache
+
+
+class FakeClock:
+    """Clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeProduct:
+    """Stands in for a ModProduct returned by the loader"""
+
+    def __init__(self, product_id):
+        self.id = product_id
+
+    def serialize(self):
+        return {"id": self.id, "title": f"Product {self.id}"}
+
+
+class TestProductCache(unittest.TestCase):
+    """Test Cases for the Product Cache"""
+
+    def setUp(self):
+        """This runs before each test"""
+        self.clock = FakeClock()
+        self.local = LRUCache(maxsize=2, ttl=10, clock=self.clock)
+        self.loads = []
+
+    def _loader(self, product_id):
+        self.loads.append(product_id)
+        return None if product_id < 0 else FakeProduct(product_id)
+
+    def test_lru_evicts_least_recently_used(self):
+        """It should evict the least recently used entry when full"""
+        self.local.set("a", 1)
+        self.local.set("b", 2)
+        self.local.get("a")
+        self.local.set("c", 3)
+        self.assertIsNone(self.local.get("b"))
+        self.assertEqual(self.local.get("a"), 1)
+        self.assertEqual(self.local.stats()["evictions"], 1)
+
+    def test_lru_expires_entries(self):
+        """It should treat entries past their TTL as misses"""
+        self.local.set("a", 1)
+        self.clock.now = 11
+        self.assertIsNone(self.local.get("a"))
+        stats = self.local.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["evictions"], 1)
+
+    def test_read_through_and_invalidate(self):
+        """It should load a product once and reload it after invalidation"""
+        cache = ProductCache(self.local)
+        first = cache.get(1, self._loader)
+        second = cache.get(1, self._loader)
+        self.assertIs(first, second)
+        self.assertEqual(self.loads, [1])
+
+        cache.invalidate(1)
+        cache.get(1, self._loader)
+        self.assertEqual(self.loads, [1, 1])
+
+    def test_missing_products_are_not_cached(self):
+        """It should not cache a product the loader did not find"""
+        cache = ProductCache(self.local)
+        self.assertIsNone(cache.get(-1, self._loader))
+        self.assertIsNone(cache.get(-1, self._loader))
+        self.assertEqual(self.loads, [-1, -1])
+
+    def test_shared_backend(self):
+        """It should fill the local tier from the shared backend"""
+        shared = LocalSharedCache(clock=self.clock)
+        cache = ProductCache(self.local, shared)
+        entry = cache.get(1, self._loader)
+
+        cache.local = LRUCache(clock=self.clock)
+        replayed = cache.get(1, self._loader)
+        self.assertEqual(self.loads, [1])
+        self.assertEqual(replayed.data, entry.data)
+        self.assertEqual(replayed.etag, entry.etag)
+
+    def test_etag_follows_content(self):
+        """It should give equal products equal ETags"""
+        self.assertEqual(
+            CachedProduct({"id": 1, "title": "Hat"}).etag,
+            CachedProduct({"title": "Hat", "id": 1}).etag,
+        )
+        self.assertNotEqual(
+            CachedProduct({"id": 1, "title": "Hat"}).etag,
+            CachedProduct({"id": 1, "title": "Cap"}).etag,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+from flask import Flask, jsonify
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine
+from service.catalog import catalog_version
+from service.models import ModProduct, ProductCategory
+from service.replica import (
+    ReplicaSet, RoutingSession, configure_replicas, reading_from_replica, replica_set
+)
+
+
+def make_product(title: str) -> ModProduct:
+    """Returns a product named after the database it is stored in"""
+    return ModProduct(
+        title=title,
+        details="Stored in the " + title,
+        cost=Decimal("10.00"),
+        available=True,
+        category=ProductCategory.TOOLS,
+    )
+
+
+class TestReadReplicas(unittest.TestCase):
+    """Test Cases for read replica routing, with SQLite files for databases"""
+
+    def setUp(self):
+        """This runs before each test"""
+        self.workdir = tempfile.TemporaryDirectory()
+        primary = "sqlite:///" + os.path.join(self.workdir.name, "primary.db")
+        self.replica_uri = "sqlite:///" + os.path.join(self.workdir.name, "replica.db")
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = primary
+        self.app.config["SQLALCHEMY_REPLICA_URIS"] = [self.replica_uri]
+        self.app.config["REPLICA_LAG_WINDOW"] = 0
+        self.db = SQLAlchemy(session_options={"class_": RoutingSession})
+        self.db.init_app(self.app)
+        configure_replicas(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+
+        # Both files get the table, each with a product telling them apart
+        for engine in [self.db.engine] + replica_set.engines:
+            ModProduct.__table__.create(engine)
+        self.db.session.add(make_product("primary"))
+        self.db.session.commit()
+        self.db.session.remove()
+        with replica_set.engines[0].begin() as connection:
+            connection.execute(
+                ModProduct.__table__.insert(),
+                {"title": "replica", "details": "Stored in the replica", "cost": 10,
+                 "available": True, "category": "TOOLS", "version": 1},
+            )
+
+        @self.app.route("/titles", methods=["GET", "POST"])
+        def titles():
+            return jsonify([p.title for p in self.db.session.query(ModProduct)])
+
+    def tearDown(self):
+        """This runs after each test"""
+        self.db.session.remove()
+        for engine in replica_set.engines:
+            engine.dispose()
+        replica_set.engines = []
+        self.db.engine.dispose()
+        self.context.pop()
+        self.workdir.cleanup()
+
+    def _titles(self) -> list:
+        return [product.title for product in self.db.session.query(ModProduct)]
+
+    def test_reads_go_to_primary_by_default(self):
+        """It should read from the primary outside read-only code"""
+        self.assertEqual(self._titles(), ["primary"])
+
+    def test_read_only_reads_go_to_replica(self):
+        """It should send read-only queries to the replica"""
+        with reading_from_replica():
+            self.assertEqual(self._titles(), ["replica"])
+
+    def test_read_your_writes(self):
+        """It should read from the primary once the session has written"""
+        self.db.session.add(make_product("written"))
+        self.db.session.commit()
+        with reading_from_replica():
+            self.assertEqual(self._titles(), ["primary", "written"])
+
+        self.db.session.remove()
+        with reading_from_replica():
+            self.assertEqual(self._titles(), ["replica"])
+
+    def test_reads_after_a_write_go_to_primary(self):
+        """It should read from the primary while replicas may lag a write"""
+        replica_set.lag_window = 60.0
+        catalog_version.bump()
+        with reading_from_replica():
+            self.assertEqual(self._titles(), ["primary"])
+        replica_set.lag_window = 0
+        with reading_from_replica():
+            self.assertEqual(self._titles(), ["replica"])
+
+    def test_locking_reads_go_to_primary(self):
+        """It should never send SELECT ... FOR UPDATE to a replica"""
+        with reading_from_replica():
+            query = self.db.session.query(ModProduct).with_for_update()
+            self.assertEqual([p.title for p in query], ["primary"])
+
+    def test_get_requests_go_to_replica(self):
+        """It should answer GET requests from the replica only"""
+        client = self.app.test_client()
+        self.assertEqual(client.get("/titles").get_json(), ["replica"])
+        self.assertEqual(client.post("/titles").get_json(), ["primary"])
+
+    def test_round_robin_and_health(self):
+        """It should alternate replicas and skip an unhealthy one"""
+        healthy = [create_engine("sqlite://"), create_engine("sqlite://")]
+        broken = create_engine("sqlite:///" + os.path.join(self.workdir.name, "no", "such.db"))
+        replicas = ReplicaSet(healthy)
+        self.assertEqual([replicas.pick() for _ in range(4)], healthy * 2)
+
+        replicas = ReplicaSet([broken, healthy[0]])
+        self.assertEqual([replicas.pick() for _ in range(2)], [healthy[0]] * 2)
+        self.assertEqual([r["healthy"] for r in replicas.stats()], [False, True])
+        self.assertIsNone(ReplicaSet([broken]).pick())
+
+    def test_falls_back_to_primary(self):
+        """It should read from the primary when no replica is healthy"""
+        replica_set.engines = [
+            create_engine("sqlite:///" + os.path.join(self.workdir.name, "no", "such.db"))
+        ]
+        with reading_from_replica():
+            self.assertEqual(self._titles(), ["primary"])
+
+
+if __name__ == "__main__":
+    unittest.main()
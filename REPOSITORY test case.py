@@ -0,0 +1,234 @@
+import logging
+import unittest
+from decimal import Decimal
+from sqlalchemy.orm.exc import StaleDataError
+from service.models import DataValidationError, ProductCategory
+from service.repository import (
+    MemoryRepository,
+    UnsupportedOperation,
+    initialize_repository,
+    product_repository,
+)
+from service import app
+from tests.factories import ModProductFactory
+
+
+class TestMemoryRepository(unittest.TestCase):
+    """Test Cases for the in-memory product repository"""
+
+    @classmethod
+    def setUpClass(cls):
+        """This runs once before the entire test suite"""
+        app.config["TESTING"] = True
+        app.config["DEBUG"] = False
+        app.config["PRODUCT_REPOSITORY"] = "memory"
+        app.logger.setLevel(logging.CRITICAL)
+        initialize_repository(app)
+
+    @classmethod
+    def tearDownClass(cls):
+        """This runs once after the entire test suite"""
+        app.config.pop("PRODUCT_REPOSITORY")
+
+    def setUp(self):
+        """This runs before each test"""
+        self.repository = product_repository
+        self.repository.delete_all()  # clean up the last tests
+
+    def test_backend_selected_by_config(self):
+        """It should use the backend named by PRODUCT_REPOSITORY"""
+        self.assertIsInstance(self.repository.backend, MemoryRepository)
+
+    def test_create_and_find(self):
+        """It should assign ids and find products by id"""
+        product = ModProductFactory(id=None)
+        self.repository.create(product)
+        self.assertIsNotNone(product.id)
+        self.assertEqual(product.version, 1)
+
+        found = self.repository.find(product.id)
+        self.assertEqual(found.serialize(), product.serialize())
+        self.assertIsNone(self.repository.find(product.id + 1))
+        self.assertEqual(len(self.repository.all()), 1)
+
+    def test_create_missing_field(self):
+        """It should refuse a product with a missing field"""
+        product = ModProductFactory(title=None)
+        self.assertRaises(DataValidationError, self.repository.create, product)
+        self.assertEqual(self.repository.all(), [])
+
+    def test_update_moves_indexes(self):
+        """It should find an updated product under its new values only"""
+        product = ModProductFactory(
+            title="Hat", category=ProductCategory.CLOTHS, available=True
+        )
+        self.repository.create(product)
+
+        product = self.repository.find(product.id)
+        product.title = "Fedora"
+        product.category = ProductCategory.HOUSEWARES
+        product.available = False
+        self.repository.update(product)
+        self.assertEqual(product.version, 2)
+
+        self.assertEqual(self.repository.find_by_name("Hat"), [])
+        self.assertEqual(self.repository.find_by_category(ProductCategory.CLOTHS), [])
+        self.assertEqual(self.repository.find_by_availability(True), [])
+        found = self.repository.find_by_name("Fedora")
+        self.assertEqual([p.id for p in found], [product.id])
+        self.assertEqual(found[0].category, ProductCategory.HOUSEWARES)
+        self.assertFalse(found[0].available)
+
+    def test_changes_need_update(self):
+        """It should not store changes made to a product until update()"""
+        product = ModProductFactory(title="Hat")
+        self.repository.create(product)
+        product.title = "Fedora"
+        self.assertEqual(self.repository.find(product.id).title, "Hat")
+        self.assertEqual(len(self.repository.find_by_name("Hat")), 1)
+
+    def test_update_stale_version(self):
+        """It should refuse an update made against a stale version"""
+        product = ModProductFactory()
+        self.repository.create(product)
+        first = self.repository.find(product.id)
+        second = self.repository.find(product.id)
+        first.cost = Decimal("10.00")
+        self.repository.update(first)
+
+        second.cost = Decimal("11.00")
+        self.assertRaises(StaleDataError, self.repository.update, second)
+        self.assertEqual(self.repository.find(product.id).cost, Decimal("10.00"))
+
+    def test_update_without_id(self):
+        """It should refuse to update a product without an id"""
+        product = ModProductFactory(id=None)
+        self.assertRaises(DataValidationError, self.repository.update, product)
+
+    def test_delete(self):
+        """It should remove a product and its index entries"""
+        product = ModProductFactory(title="Hat")
+        self.repository.create(product)
+        self.repository.delete(product)
+        self.assertIsNone(self.repository.find(product.id))
+        self.assertEqual(self.repository.find_by_name("Hat"), [])
+
+    def test_find_by_fields(self):
+        """It should find products by name, price, availability and category"""
+        for title, cost, available, category in (
+            ("Hat", "12.50", True, ProductCategory.CLOTHS),
+            ("Hat", "20.00", False, ProductCategory.CLOTHS),
+            ("Hammer", "12.50", True, ProductCategory.TOOLS),
+        ):
+            self.repository.create(ModProductFactory(
+                title=title, cost=Decimal(cost), available=available, category=category
+            ))
+
+        self.assertEqual(len(self.repository.find_by_name("Hat")), 2)
+        self.assertEqual(len(self.repository.find_by_price("12.50")), 2)
+        self.assertEqual(len(self.repository.find_by_availability(False)), 1)
+        tools = self.repository.find_by_category(ProductCategory.TOOLS)
+        self.assertEqual([p.title for p in tools], ["Hammer"])
+
+    def test_search(self):
+        """It should combine every filter of a search"""
+        for cost, available in (("10.00", True), ("30.00", True), ("30.00", False)):
+            self.repository.create(ModProductFactory(
+                title="Hat", cost=Decimal(cost), available=available,
+                category=ProductCategory.CLOTHS,
+            ))
+        self.repository.create(ModProductFactory(
+            title="Saw", cost=Decimal("30.00"), available=True,
+            category=ProductCategory.TOOLS,
+        ))
+
+        found = self.repository.search(
+            name="Hat", category=ProductCategory.CLOTHS, available=True,
+            min_cost=Decimal("20.00"),
+        )
+        self.assertEqual([str(p.cost) for p in found], ["30.00"])
+        self.assertEqual(len(self.repository.search(max_cost=Decimal("10.00"))), 1)
+        self.assertEqual(len(self.repository.search()), 4)
+        self.assertEqual(self.repository.search(name="Fedora"), [])
+
+    def test_delete_all(self):
+        """It should empty the catalog and report how many were removed"""
+        for _ in range(3):
+            self.repository.create(ModProductFactory())
+        self.assertEqual(self.repository.delete_all(), 3)
+        self.assertEqual(self.repository.all(), [])
+
+    def test_update_all(self):
+        """It should apply patches, refusing stale versions and missing ids"""
+        product = ModProductFactory(title="Hat", available=True)
+        self.repository.create(product)
+        results = self.repository.update_all([
+            {"id": product.id, "version": 1, "available": False},
+            {"id": product.id + 1, "title": "Cap"},
+            {"title": "Cap"},
+        ])
+        self.assertEqual([r["status"] for r in results], [200, 404, 400])
+        self.assertEqual(self.repository.find_by_availability(False)[0].version, 2)
+        results = self.repository.update_all([{"id": product.id, "version": 1, "title": "Cap"}])
+        self.assertEqual(results[0]["status"], 409)
+
+    def test_create_all_and_delete_ids(self):
+        """It should create valid items and delete by id"""
+        data = ModProductFactory().serialize()
+        results = self.repository.create_all([data, {"title": "Hat"}])
+        self.assertIn("id", results[0])
+        self.assertIn("error", results[1])
+        ids = [results[0]["id"], results[0]["id"] + 1]
+        self.assertEqual(self.repository.delete_ids(ids), 1)
+        self.assertEqual(self.repository.all(), [])
+
+    def test_create_all_bad_cost(self):
+        """It should report an item with a non-numeric cost and create the rest"""
+        items = [ModProductFactory().serialize() for _ in range(3)]
+        items[1]["cost"] = "lots"
+        results = self.repository.create_all(items)
+        self.assertEqual([("error" in result) for result in results], [False, True, False])
+        self.assertIn("cost", results[1]["error"])
+        self.assertEqual(len(self.repository.all()), 2)
+
+    def test_delete_all_by_filter(self):
+        """It should delete only the products matching the filters"""
+        self.repository.create(ModProductFactory(title="Hat"))
+        self.repository.create(ModProductFactory(title="Saw"))
+        self.assertEqual(self.repository.delete_all(name="Hat", category=None), 1)
+        self.assertEqual([p.title for p in self.repository.all()], ["Saw"])
+
+    def test_search_text_and_facets(self):
+        """It should search text and count facets without a database"""
+        self.repository.create(ModProductFactory(
+            title="Lighthouse", cost=Decimal("5.00"), available=True,
+            category=ProductCategory.TOOLS,
+        ))
+        found = self.repository.search_text("lighthouse")
+        self.assertEqual([p.title for p in found], ["Lighthouse"])
+        facets = self.repository.facets((10, 100))
+        self.assertEqual(facets["total"], 1)
+        self.assertEqual(facets["categories"]["TOOLS"], {"count": 1, "available": 1})
+        self.assertEqual([bucket["count"] for bucket in facets["prices"]], [1, 0, 0])
+
+    def test_unsupported_operations(self):
+        """It should refuse sync and idempotent creates with a clear error"""
+        self.assertRaises(UnsupportedOperation, self.repository.sync, [])
+        self.assertRaises(
+            UnsupportedOperation, self.repository.create_once, ModProductFactory(), "key"
+        )
+        self.assertRaises(
+            UnsupportedOperation, self.repository.create_all, [], idempotency_key="key"
+        )
+
+    def test_unknown_backend(self):
+        """It should refuse an unknown PRODUCT_REPOSITORY"""
+        app.config["PRODUCT_REPOSITORY"] = "flatfile"
+        try:
+            self.assertRaises(ValueError, initialize_repository, app)
+        finally:
+            app.config["PRODUCT_REPOSITORY"] = "memory"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from service.catalog import catalog_version
+from service.result_cache import ResultCache
+
+
+class FakeClock:
+    """Clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResultCache(unittest.TestCase):
+    """Test Cases for the Result Cache"""
+
+    def setUp(self):
+        """This runs before each test"""
+        self.clock = FakeClock()
+        self.cache = ResultCache(maxsize=4, ttl=10, stale_ttl=5, clock=self.clock)
+        self.calls = 0
+
+    def _encode(self):
+        self.calls += 1
+        return f"[{self.calls}]".encode(), {"X-Call": str(self.calls)}
+
+    def test_hit_returns_stored_bytes(self):
+        """It should encode a result once while it is fresh"""
+        first = self.cache.get(("category", "FOOD"), self._encode)
+        second = self.cache.get(("category", "FOOD"), self._encode)
+        self.assertIs(second, first)
+        self.assertEqual(second.body, b"[1]")
+        self.assertEqual(second.headers, {"X-Call": "1"})
+        self.assertEqual(self.calls, 1)
+
+    def test_new_version_serves_stale_and_refreshes(self):
+        """It should serve the stale result while refreshing in the background"""
+        self.cache.get("key", self._encode)
+        catalog_version.bump()
+        self.assertEqual(self.cache.get("key", self._encode).body, b"[1]")
+        self.cache.wait()
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.cache.get("key", self._encode).body, b"[2]")
+        stats = self.cache.stats()
+        self.assertEqual(stats["stale_hits"], 1)
+        self.assertEqual(stats["refreshes"], 1)
+
+    def test_expired_past_stale_window(self):
+        """It should encode again in the request once the stale window is over"""
+        self.cache.get("key", self._encode)
+        self.clock.now = 16
+        self.assertEqual(self.cache.get("key", self._encode).body, b"[2]")
+        self.assertEqual(self.cache.stats()["refreshes"], 0)
+
+    def test_no_stale_serving(self):
+        """It should encode again at once when stale serving is off"""
+        cache = ResultCache(ttl=10, stale_ttl=0, clock=self.clock)
+        cache.get("key", self._encode)
+        catalog_version.bump()
+        self.assertEqual(cache.get("key", self._encode).body, b"[2]")
+
+    def test_failed_refresh_drops_entry(self):
+        """It should drop a result whose refresh failed"""
+        self.cache.get("key", self._encode)
+        self.clock.now = 12
+
+        def failing():
+            raise RuntimeError("database went away")
+
+        self.assertEqual(self.cache.get("key", failing).body, b"[1]")
+        self.cache.wait()
+        self.assertEqual(self.cache.get("key", self._encode).body, b"[2]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+"""
+Async read path
+
+An ASGI application that answers the read routes, GET /products/<id> and
+GET /products with its name, category, available, min_cost, max_cost,
+sort, limit and cursor parameters, on an async SQLAlchemy engine. A
+worker is no longer tied up by a request while the database works, so
+concurrency is bounded by the connection pool instead of by the number of
+WSGI threads.
+
+The responses are those of the Flask routes: rows are encoded by the same
+row encoder, pages use the same cursors, and single products go through
+the product cache with the same ETags. Every other request (writes,
+streaming exports, the by-name/category/availability routes, ...) is
+handed to the Flask app unchanged.
+
+    uvicorn --factory service.asgi:create_app --workers 4
+
+The async engine connects to SQLALCHEMY_ASYNC_DATABASE_URI, which defaults
+to SQLALCHEMY_DATABASE_URI with the asyncpg or aiosqlite driver; point it
+at a replica to keep storefront reads off the primary. Query parameters
+are parsed by the same functions as in the Flask routes, so a repeated
+parameter takes its first value on both paths.
+"""
+import json
+from urllib.parse import urlencode
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.http import parse_etags, quote_etag
+from service.cache import product_cache
+from service.encoders import (
+    PRODUCT_COLUMNS, encode_list, row_encoder, serialize_row, use_row_encoder
+)
+from service.models import ModProduct
+from service.pagination import PaginationError, page_items, page_query, parse_limit
+from service.pool import engine_options
+from service.query_params import (
+    QueryParameterError, parse_query_string, parse_sort, product_filters
+)
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_uri(config) -> str:
+    """Returns the URI of the async engine for the app configuration"""
+    uri = config.get("SQLALCHEMY_ASYNC_DATABASE_URI")
+    if uri:
+        return uri
+    uri = config["SQLALCHEMY_DATABASE_URI"]
+    scheme, rest = uri.split("://", 1)
+    driver = ASYNC_DRIVERS.get(scheme.split("+")[0])
+    if driver is None:
+        raise ValueError(
+            f"No async driver known for {scheme}, set SQLALCHEMY_ASYNC_DATABASE_URI"
+        )
+    return f"{driver}://{rest}"
+
+
+def async_engine_options(config, uri: str) -> dict:
+    """Returns the DB_* pool settings in the form the async engine takes"""
+    options = engine_options(config, uri)
+    options.pop("poolclass", None)  # the async engine needs its own pool class
+    options.pop("connect_args", None)
+    timeout = config.get("DB_STATEMENT_TIMEOUT")
+    if timeout and uri.startswith("postgresql+asyncpg"):
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(int(timeout))}}
+    return options
+
+
+class ProductsASGI:
+    """Serves the product read routes asynchronously, the rest through Flask"""
+
+    def __init__(self, app, engine=None):
+        self.app = app
+        uri = async_database_uri(app.config)
+        self.engine = engine or create_async_engine(uri, **async_engine_options(app.config, uri))
+        self.fallback = WsgiToAsgi(app)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        handler = self._route(scope)
+        if handler is None:
+            await self.fallback(scope, receive, send)
+            return
+        try:
+            status, headers, body = await handler(scope)
+        except (PaginationError, QueryParameterError) as error:
+            status, headers, body = self._error(400, "Bad Request", str(error))
+        if scope["method"] == "HEAD":
+            body = b""
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (name.encode("latin-1"), value.encode("latin-1")) for name, value in headers
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _route(self, scope):
+        """Returns the handler for a request, or None to hand it to Flask"""
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return None
+        path = scope["path"].rstrip("/")
+        if path == "/products":
+            args = parse_query_string(scope["query_string"].decode("latin-1"))
+            accept = _header(scope, "accept") or ""
+            streaming = "application/x-ndjson" in accept or args.get("stream")
+            if streaming or not use_row_encoder(self.app):
+                return None
+            return self.list_products
+        prefix, _, product_id = path.rpartition("/")
+        if prefix == "/products" and product_id.isdigit():
+            return self.get_product
+        return None
+
+    async def get_product(self, scope):
+        """Returns one product, answering If-None-Match with a 304"""
+        product_id = int(scope["path"].rstrip("/").rpartition("/")[2])
+        entry = product_cache.lookup(product_id)
+        if entry is None:
+            async with self.engine.connect() as connection:
+                result = await connection.execute(
+                    select(*PRODUCT_COLUMNS).where(ModProduct.id == product_id)
+                )
+                row = result.first()
+            if row is None:
+                return self._error(
+                    404, "Not Found", f"Product with id '{product_id}' was not found."
+                )
+            entry = product_cache.store(product_id, serialize_row(row))
+        headers = [("ETag", quote_etag(entry.etag))]
+        if parse_etags(_header(scope, "if-none-match")).contains(entry.etag):
+            # Same as the Flask route: a 304 carries the ETag but no body
+            return 304, headers, b""
+        headers.append(("Content-Type", "application/json"))
+        return 200, headers, self.app.json.response(entry.data).get_data()
+
+    async def list_products(self, scope):
+        """Returns one page of the products matching the filters"""
+        args = parse_query_string(scope["query_string"].decode("latin-1"))
+        criteria = ModProduct.search_criteria(**product_filters(args))
+        sort_column, descending = parse_sort(args.get("sort"))
+        limit = parse_limit(
+            args.get("limit"),
+            default=self.app.config.get("PAGE_SIZE_DEFAULT", 100),
+            maximum=self.app.config.get("PAGE_SIZE_MAX", 1000),
+        )
+        statement, keys = page_query(
+            select(*PRODUCT_COLUMNS).where(*criteria),
+            ModProduct,
+            limit,
+            args.get("cursor"),
+            sort_column=sort_column,
+            descending=descending,
+        )
+        async with self.engine.connect() as connection:
+            rows = (await connection.execute(statement)).all()
+        products, next_cursor = page_items(rows, keys, limit)
+
+        body = encode_list(products, row_encoder(self.app)).encode("utf-8")
+        headers = [("Content-Type", "application/json")]
+        if next_cursor:
+            args.update(limit=str(limit), cursor=next_cursor)
+            scheme = scope.get("scheme", "http")
+            host = _header(scope, "host") or "localhost"
+            next_url = f"{scheme}://{host}{scope['path']}?{urlencode(args)}"
+            headers.append(("X-Next-Cursor", next_cursor))
+            headers.append(("Link", f'<{next_url}>; rel="next"'))
+        return 200, headers, body
+
+    @staticmethod
+    def _error(status: int, error: str, message: str) -> tuple:
+        body = json.dumps({"status": status, "error": error, "message": message})
+        return status, [("Content-Type", "application/json")], body.encode("utf-8")
+
+
+def _header(scope, name: str):
+    """Returns the value of a request header, or None"""
+    key = name.encode("latin-1")
+    for header, value in scope["headers"]:
+        if header == key:
+            return value.decode("latin-1")
+    return None
+
+
+def create_app():
+    """Returns the ASGI application for the service"""
+    from service import app  # pylint: disable=import-outside-toplevel
+
+    if app.config.get("PRODUCT_REPOSITORY", "sql") != "sql":
+        # The async read path queries the database itself
+        return WsgiToAsgi(app)
+    return ProductsASGI(app)
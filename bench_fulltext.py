@@ -0,0 +1,76 @@
+"""
+Benchmark: full-text search over a synthetic catalog
+
+Loads a corpus generated with ModProductFactory through the bulk create
+path, then times ModProduct.search_text() against a LIKE scan over title
+and details for the same queries.
+
+    DATABASE_URI=sqlite:////tmp/bench.db python bench_fulltext.py --rows 1000000
+"""
+import os
+import time
+import argparse
+from sqlalchemy import or_
+from service import app
+from service.fulltext import search_index
+from service.models import db, initialize_db, ModProduct
+from tests.factories import ModProductFactory
+
+DATABASE_URI = os.getenv("DATABASE_URI", "sqlite:////tmp/bench_fulltext.db")
+QUERIES = ["red hat", "table", "development policy", "seven", "international"]
+
+
+def load_corpus(rows: int, chunk_size: int = 5000):
+    """Replaces the catalog with rows fake products"""
+    db.session.query(ModProduct).delete()
+    db.session.commit()
+    start = time.perf_counter()
+    for offset in range(0, rows, chunk_size):
+        items = []
+        for _ in range(min(chunk_size, rows - offset)):
+            data = ModProductFactory().serialize()
+            del data["id"]
+            items.append(data)
+        ModProduct.create_all(items, chunk_size=chunk_size)
+    print(f"loaded {rows} products in {time.perf_counter() - start:.1f}s")
+
+
+def like_scan(text_query: str, limit: int) -> list:
+    """Searches with a LIKE scan, the approach the index replaces"""
+    patterns = [f"%{word}%" for word in text_query.split()]
+    clauses = [ModProduct.title.ilike(p) for p in patterns]
+    clauses += [ModProduct.details.ilike(p) for p in patterns]
+    return ModProduct.query.filter(or_(*clauses)).limit(limit).all()
+
+
+def timed(function, *args, repeat: int = 5) -> float:
+    """Returns the best wall time of repeat calls in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--skip-load", action="store_true")
+    args = parser.parse_args()
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
+    initialize_db(app)
+    if not args.skip_load:
+        load_corpus(args.rows)
+    print(f"backend: {type(search_index.backend).__name__}")
+
+    for text_query in QUERIES:
+        indexed = timed(ModProduct.search_text, text_query, args.limit)
+        scanned = timed(like_scan, text_query, args.limit, repeat=1)
+        print(f"{text_query!r:24} index {indexed:9.2f} ms   LIKE scan {scanned:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
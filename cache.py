@@ -0,0 +1,234 @@
+"""
+Product cache
+
+Read-through cache in front of ModProduct.find(). Entries hold the
+serialized product and its ETag, so a hit costs neither a query nor a call
+to serialize(). The in-process LRUCache is always used. A shared backend
+(memcached, Redis, ...) can be layered behind it by implementing
+CacheBackend; LocalSharedCache is an in-process stand-in for one.
+"""
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class CacheBackend:
+    """Interface for cache storage
+
+    Values handed to a shared backend are bytes, exactly as they would be
+    sent over the wire to a cache server.
+    """
+
+    def get(self, key: str):
+        """Returns the value stored under key, or None"""
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float = None):
+        """Stores value under key for ttl seconds"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """Removes key if present"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Removes every key"""
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    """In-process cache bounded by entry count and time to live"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.misses += 1
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value, ttl: float = None):
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Returns the hit, miss and eviction counters"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class LocalSharedCache(CacheBackend):
+    """In-process stand-in for a shared cache server"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: str, value, ttl: float = None):
+        expires_at = None if ttl is None else self._clock() + ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CachedProduct:
+    """A serialized product and the ETag of that serialization"""
+
+    __slots__ = ("data", "etag")
+
+    def __init__(self, data: dict, etag: str = None):
+        self.data = data
+        self.etag = etag or make_etag(data)
+
+    def to_bytes(self) -> bytes:
+        """Encodes the entry for a shared backend"""
+        return json.dumps({"data": self.data, "etag": self.etag}).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, raw: bytes):
+        """Decodes an entry written by to_bytes()"""
+        entry = json.loads(raw)
+        return cls(entry["data"], entry["etag"])
+
+
+def make_etag(data: dict) -> str:
+    """Returns a strong ETag for a serialized product"""
+    raw = json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+class ProductCache:
+    """Read-through product cache with explicit invalidation"""
+
+    def __init__(self, local: LRUCache, shared: CacheBackend = None):
+        self.local = local
+        self.shared = shared
+
+    @staticmethod
+    def _key(product_id) -> str:
+        return f"product:{product_id}"
+
+    def get(self, product_id, loader):
+        """Returns the CachedProduct for product_id, loading it on a miss
+
+        ``loader`` is called with the id and returns the product or None.
+        Missing products are not cached.
+        """
+        entry = self.lookup(product_id)
+        if entry is not None:
+            return entry
+        product = loader(product_id)
+        if product is None:
+            return None
+        return self.store(product_id, product.serialize())
+
+    def lookup(self, product_id):
+        """Returns the cached CachedProduct for product_id, or None"""
+        key = self._key(product_id)
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry
+        if self.shared is not None:
+            raw = self.shared.get(key)
+            if raw is not None:
+                entry = CachedProduct.from_bytes(raw)
+                self.local.set(key, entry)
+                return entry
+        return None
+
+    def store(self, product_id, data: dict):
+        """Caches the serialized product and returns its CachedProduct"""
+        key = self._key(product_id)
+        entry = CachedProduct(data)
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry.to_bytes(), self.local.ttl)
+        return entry
+
+    def invalidate(self, product_id):
+        """Drops product_id from every cache tier"""
+        key = self._key(product_id)
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        """Drops every product from every cache tier"""
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self) -> dict:
+        """Returns the counters of the in-process tier"""
+        return self.local.stats()
+
+
+# The product cache used by ModProduct, sized later by configure_cache()
+product_cache = ProductCache(LRUCache())
+
+
+def configure_cache(app):
+    """Sizes the product cache from the app configuration"""
+    product_cache.local = LRUCache(
+        maxsize=app.config.get("PRODUCT_CACHE_SIZE", 1024),
+        ttl=app.config.get("PRODUCT_CACHE_TTL", 300.0),
+    )
+    product_cache.shared = app.config.get("PRODUCT_CACHE_SHARED_BACKEND")
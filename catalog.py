@@ -0,0 +1,43 @@
+"""
+Catalog version
+
+A counter bumped after every committed write to the catalog. Anything
+derived from many products at once, such as facet counts, is stored with
+the version it was computed at and recomputed once the version moves on,
+instead of being invalidated product by product.
+
+The counter lives in the process. Writes made by other processes are not
+seen, so every cache keyed by it also has a time to live.
+"""
+import time
+import threading
+
+
+class CatalogVersion:
+    """A thread-safe counter of catalog writes"""
+
+    def __init__(self, clock=time.monotonic):
+        self._value = 0
+        self._clock = clock
+        self._changed_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> int:
+        """Returns the version of the catalog"""
+        return self._value
+
+    def bump(self) -> int:
+        """Records a write and returns the new version"""
+        with self._lock:
+            self._value += 1
+            self._changed_at = self._clock()
+            return self._value
+
+    def changed_within(self, seconds: float) -> bool:
+        """Returns True when the last write was less than seconds ago"""
+        changed_at = self._changed_at
+        return changed_at is not None and self._clock() - changed_at < seconds
+
+
+catalog_version = CatalogVersion()
@@ -0,0 +1,125 @@
+"""
+Row encoder for read-only product listings
+
+List endpoints select the product columns as plain rows, which skips ORM
+instance construction and identity-map bookkeeping, and encode each row
+with an encoder built once for the app's JSON settings. The output is
+byte-for-byte what jsonify() produces for serialize().
+
+The encoder only covers compact output (the default outside debug mode);
+use_row_encoder() is False otherwise and callers fall back to serialize().
+"""
+from operator import itemgetter
+from json.encoder import encode_basestring, encode_basestring_ascii
+from service.models import ModProduct
+
+# Columns in the order the row encoder below indexes them
+PRODUCT_COLUMNS = (
+    ModProduct.id,
+    ModProduct.title,
+    ModProduct.details,
+    ModProduct.cost,
+    ModProduct.available,
+    ModProduct.category,
+    ModProduct.version,
+)
+
+# Key order of ModProduct.serialize()
+SERIALIZED_FIELDS = (
+    "id",
+    "title",
+    "details",
+    "cost",
+    "available",
+    "category",
+    "version",
+)
+
+_encoders = {}
+
+
+def _field_renderer(encode_str):
+    """Returns a function rendering the fields of a row of PRODUCT_COLUMNS
+
+    The values come back in SERIALIZED_FIELDS order, as the text that
+    stands between the quotes or separators of the JSON.
+    """
+
+    def render(row):
+        return (
+            row[0],
+            encode_str(row[1]),
+            encode_str(row[2]),
+            row[3],
+            "true" if row[4] else "false",
+            row[5].name,
+            row[6],
+        )
+
+    return render
+
+
+# Fields whose rendered value the template wraps in quotes
+_QUOTED_FIELDS = ("cost", "category")
+
+
+def compile_row_encoder(sort_keys: bool = True, ensure_ascii: bool = True):
+    """Returns a function encoding one row as the JSON of serialize()
+
+    The key names, separators and field order are folded into one %-format
+    template up front, so encoding a row is rendering its fields and a
+    single % over them.
+    """
+    encode_str = encode_basestring_ascii if ensure_ascii else encode_basestring
+    keys = sorted(SERIALIZED_FIELDS) if sort_keys else SERIALIZED_FIELDS
+    template = ""
+    for position, key in enumerate(keys):
+        prefix = ("{" if position == 0 else ",") + encode_str(key) + ":"
+        template += prefix.replace("%", "%%")
+        template += '"%s"' if key in _QUOTED_FIELDS else "%s"
+    template += "}"
+    reorder = itemgetter(*(SERIALIZED_FIELDS.index(key) for key in keys))
+    render = _field_renderer(encode_str)
+
+    def encode_row(row):
+        return template % reorder(render(row))
+
+    return encode_row
+
+
+def use_row_encoder(app) -> bool:
+    """Returns True when the app's JSON settings produce compact output"""
+    compact = getattr(app.json, "compact", None)
+    return compact or (compact is None and not app.debug)
+
+
+def row_encoder(app):
+    """Returns the row encoder matching the app's JSON settings"""
+    settings = (app.json.sort_keys, app.json.ensure_ascii)
+    encoder = _encoders.get(settings)
+    if encoder is None:
+        encoder = _encoders[settings] = compile_row_encoder(*settings)
+    return encoder
+
+
+def project(query):
+    """Narrows a ModProduct query to the serialized columns"""
+    return query.with_entities(*PRODUCT_COLUMNS)
+
+
+def encode_list(rows, encode_row) -> str:
+    """Encodes rows as the body jsonify() returns for a list of products"""
+    return "[" + ",".join(map(encode_row, rows)) + "]\n"
+
+
+def serialize_row(row) -> dict:
+    """Returns what serialize() returns for a row of PRODUCT_COLUMNS"""
+    return {
+        "id": row[0],
+        "title": row[1],
+        "details": row[2],
+        "cost": str(row[3]),
+        "available": row[4],
+        "category": row[5].name,
+        "version": row[6],
+    }
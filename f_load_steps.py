@@ -1,37 +1,121 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from behave import given
 
 # HTTP Return Codes
 HTTP_200_OK = 200
 HTTP_201_CREATED = 201
 HTTP_204_NO_CONTENT = 204
+HTTP_404_NOT_FOUND = 404
+HTTP_405_METHOD_NOT_ALLOWED = 405
+
+# Parallel requests used when the service has no bulk endpoints
+SEED_WORKERS = 8
+
+# One keep-alive connection pool for the whole run; behave clears context
+# attributes after every scenario, so it is kept at module level. A
+# requests.Session is not thread-safe, so every thread gets its own session
+# mounted on the shared adapter, whose urllib3 pool is.
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SEED_WORKERS)
+_local = threading.local()
+
+
+def get_session():
+    """ Returns the HTTP session of the calling thread """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+        session.mount('http://', _adapter)
+        session.mount('https://', _adapter)
+    return session
+
+
+def product_payload(row):
+    """ Converts a row of the feature table into a create request body """
+    return {
+        "title": row["name"],
+        "details": row["description"],
+        "cost": row["price"],
+        "available": row["available"] == "True",
+        "category": row["category"].upper(),
+    }
+
+
+def bulk_reset_and_seed(context, session, rest_endpoint, products):
+    """ Empties and loads the catalog with one request each
+
+    Returns False when the service has no bulk endpoints.
+    """
+    context.resp = session.delete(f"{rest_endpoint}?all=true")
+    if context.resp.status_code in (HTTP_404_NOT_FOUND, HTTP_405_METHOD_NOT_ALLOWED):
+        return False
+    assert(context.resp.status_code == HTTP_200_OK)
+
+    context.resp = session.post(f"{rest_endpoint}/batch", json=products)
+    if context.resp.status_code in (HTTP_404_NOT_FOUND, HTTP_405_METHOD_NOT_ALLOWED):
+        concurrent_seed(context, rest_endpoint, products)
+        return True
+    assert(context.resp.status_code == HTTP_201_CREATED)
+    return True
+
+
+def list_product_ids(context, session, rest_endpoint):
+    """ Returns the id of every product, following the page cursors """
+    ids = []
+    url = rest_endpoint
+    while url:
+        context.resp = session.get(url)
+        assert(context.resp.status_code == HTTP_200_OK)
+        ids.extend(product['id'] for product in context.resp.json())
+        cursor = context.resp.headers.get('X-Next-Cursor')
+        url = f"{rest_endpoint}?cursor={cursor}" if cursor else None
+    return ids
+
+
+def concurrent_reset(context, rest_endpoint):
+    """ Deletes the products one request each, several at a time """
+    ids = list_product_ids(context, get_session(), rest_endpoint)
+    with ThreadPoolExecutor(max_workers=SEED_WORKERS) as executor:
+        responses = list(executor.map(
+            lambda product_id: get_session().delete(f"{rest_endpoint}/{product_id}"), ids
+        ))
+    for response in responses:
+        context.resp = response
+        assert(context.resp.status_code in (HTTP_200_OK, HTTP_204_NO_CONTENT))
+
+
+def concurrent_seed(context, rest_endpoint, products):
+    """ Creates the products one request each, several at a time """
+    with ThreadPoolExecutor(max_workers=SEED_WORKERS) as executor:
+        responses = list(executor.map(
+            lambda product: get_session().post(rest_endpoint, json=product), products
+        ))
+    for response in responses:
+        context.resp = response
+        assert(context.resp.status_code == HTTP_201_CREATED)
+
 
 @given('the following products')
 def step_impl(context):
     """ Delete all Products and load new ones """
-    #
-    # List all of the products and delete them one by one
-    #
+    start = time.perf_counter()
+    session = get_session()
     rest_endpoint = f"{context.base_url}/products"
-    context.resp = requests.get(rest_endpoint)
-    assert(context.resp.status_code == HTTP_200_OK)
-    for product in context.resp.json():
-        context.resp = requests.delete(f"{rest_endpoint}/{product['id']}")
-        assert(context.resp.status_code == HTTP_204_NO_CONTENT)
+    products = [product_payload(row) for row in context.table]
 
     #
-    # load the database with new products
+    # Reset and load the catalog in bulk, or fall back to parallel
+    # single-product requests against services without bulk endpoints
     #
-    for row in context.table:
-        # Create a new product object
-        product = Product()
-
-        # Set the product's attributes based on the row data
-        product.name = row["name"]
-        product.description = row["description"]
-        product.price = Decimal(row["price"])
-        product.available = True if row["available"] == "True" else False
-
-        # Post the product to the REST API endpoint to create it
-        context.resp = requests.post(rest_endpoint, json=product.serialize())
-        assert(context.resp.status_code == HTTP_201_CREATED)
\ No newline at end of file
+    if not bulk_reset_and_seed(context, session, rest_endpoint, products):
+        concurrent_reset(context, rest_endpoint)
+        concurrent_seed(context, rest_endpoint, products)
+
+    logging.info(
+        'Seeded %d products for "%s" in %.3fs',
+        len(products), context.scenario.name, time.perf_counter() - start
+    )
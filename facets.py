@@ -0,0 +1,111 @@
+"""
+Product facets
+
+The counts behind the storefront sidebar: products and available products
+per category, and products per price bucket. They come from two aggregate
+queries, the first answered from the (category, available) index, and
+are cached until the catalog version moves on or FACETS_CACHE_TTL expires.
+"""
+import time
+import threading
+from collections import Counter
+from sqlalchemy import func
+from service.catalog import catalog_version
+from service.models import ModProduct, ProductCategory
+
+# Upper bounds of the price buckets; the last bucket has no upper bound
+PRICE_BUCKETS = (10, 25, 50, 100, 250, 500, 1000)
+
+
+def compute_facets(session, price_buckets: tuple = PRICE_BUCKETS) -> dict:
+    """Counts the catalog by category, availability and price bucket"""
+    groups = session.query(
+        ModProduct.category, ModProduct.available, func.count(ModProduct.id)
+    ).group_by(ModProduct.category, ModProduct.available)
+
+    # One row of cumulative counts, cost < each bound, instead of a GROUP BY
+    # over a CASE expression
+    below = []
+    if price_buckets:
+        below = list(session.query(*(
+            func.count(ModProduct.id).filter(ModProduct.cost < bound)
+            for bound in price_buckets
+        )).one())
+    return _facets(groups, below, price_buckets)
+
+
+def count_facets(products, price_buckets: tuple = PRICE_BUCKETS) -> dict:
+    """Counts products held in memory the way compute_facets() counts the table"""
+    groups = Counter()
+    below = [0] * len(price_buckets)
+    for product in products:
+        groups[product.category, product.available] += 1
+        for position, bound in enumerate(price_buckets):
+            if product.cost < bound:
+                below[position] += 1
+    return _facets(
+        ((category, available, count) for (category, available), count in groups.items()),
+        below,
+        price_buckets,
+    )
+
+
+def _facets(groups, below: list, price_buckets: tuple) -> dict:
+    """Builds the facets from (category, available, count) groups
+
+    below holds the number of products under each price bound.
+    """
+    categories = {category.name: {"count": 0, "available": 0} for category in ProductCategory}
+    total = available = 0
+    for category, is_available, count in groups:
+        categories[category.name]["count"] += count
+        total += count
+        if is_available:
+            categories[category.name]["available"] += count
+            available += count
+
+    prices = []
+    lower, counted = 0, 0
+    for bound, cumulative in zip(list(price_buckets) + [None], list(below) + [total]):
+        prices.append({"min": lower, "max": bound, "count": cumulative - counted})
+        lower, counted = bound, cumulative
+
+    return {
+        "total": total,
+        "available": available,
+        "categories": categories,
+        "prices": prices,
+    }
+
+
+class FacetCache:
+    """Holds the last facets with the catalog version they were counted at"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def get(self, compute, ttl: float) -> dict:
+        """Returns the cached facets, calling compute() when they are stale"""
+        entry = self._entry
+        now = self._clock()
+        if entry is not None and entry[0] == catalog_version.current and entry[1] > now:
+            return entry[2]
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[0] == catalog_version.current and entry[1] > now:
+                return entry[2]
+            # Read the version first, so a write made while counting makes
+            # the result stale rather than hiding the write
+            version = catalog_version.current
+            facets = compute()
+            self._entry = (version, self._clock() + ttl, facets)
+            return facets
+
+    def clear(self):
+        """Drops the cached facets"""
+        self._entry = None
+
+
+facet_cache = FacetCache()
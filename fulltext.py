@@ -0,0 +1,295 @@
+"""
+Full-text product search
+
+Searches the title and details of every product, title terms counting
+twice. On SQLite builds with FTS5 the index is an FTS5 table kept in step
+with the product table by triggers, ranked with BM25. On PostgreSQL the
+product table is searched through a GIN index over its tsvector, ranked
+with ts_rank. Either way the index changes in the same transaction as
+every write, set-based ones included, and every worker process sees it.
+Elsewhere an in-process inverted index is built at start up and then
+maintained from ModProduct create/update/delete; it only sees the writes
+of its own process, so run a single worker there.
+"""
+import re
+import math
+import heapq
+import threading
+from operator import itemgetter
+from collections import Counter, defaultdict
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+TOKEN_RE = re.compile(r"\w+")
+TITLE_WEIGHT = 2
+
+
+def tokenize(value: str) -> list:
+    """Splits text into lower-case word tokens"""
+    if not value:
+        return []
+    return TOKEN_RE.findall(value.lower())
+
+
+class InvertedIndex:
+    """In-process inverted index with BM25 ranking"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(dict)  # term -> {product id: term count}
+        self._documents = {}  # product id -> Counter of its terms
+        self._lengths = {}  # product id -> weighted number of terms
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, product):
+        """Indexes a product, replacing any earlier version of it"""
+        terms = Counter()
+        for term in tokenize(product.title):
+            terms[term] += TITLE_WEIGHT
+        terms.update(tokenize(product.details))
+        with self._lock:
+            self._remove(product.id)
+            self._documents[product.id] = terms
+            self._lengths[product.id] = sum(terms.values())
+            self._total_length += self._lengths[product.id]
+            for term, count in terms.items():
+                self._postings[term][product.id] = count
+
+    def remove(self, product_id):
+        """Removes a product from the index"""
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        terms = self._documents.pop(product_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._lengths.pop(product_id)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[product_id]
+            if not postings:
+                del self._postings[term]
+
+    def clear(self):
+        """Removes every product from the index"""
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._lengths.clear()
+            self._total_length = 0
+
+    def rebuild(self, rows):
+        """Replaces the index with rows holding id, title and details"""
+        with self._lock:
+            self.clear()
+            for row in rows:
+                self.add(row)
+
+    def search(self, query: str, limit: int) -> list:
+        """Returns up to limit (product id, score) pairs, best first"""
+        with self._lock:
+            count = len(self._documents)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                frequency = len(postings)
+                idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+                for product_id, term_count in postings.items():
+                    length = self._lengths[product_id]
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[product_id] += (
+                        idf * term_count * (self.k1 + 1) / (term_count + norm)
+                    )
+        return heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+
+
+class Fts5Index:
+    """SQLite FTS5 index over an external content table"""
+
+    def __init__(self, session, table: str):
+        self.session = session
+        self.table = table
+        self.fts_table = f"{table}_fts"
+
+    def install(self) -> bool:
+        """Creates the FTS5 table and its triggers
+
+        Returns False when SQLite was built without FTS5. A newly created
+        index is filled from the rows already in the table.
+        """
+        table, fts = self.table, self.fts_table
+        exists = self.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": fts},
+        ).first()
+        try:
+            self.session.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"title, details, content='{table}', content_rowid='id')"
+            ))
+        except OperationalError:
+            self.session.rollback()
+            return False
+        self.session.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, title, details) "
+            f"VALUES (new.id, new.title, new.details); END"
+        ))
+        self.session.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, title, details) "
+            f"VALUES ('delete', old.id, old.title, old.details); END"
+        ))
+        self.session.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF title, details "
+            f"ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, title, details) "
+            f"VALUES ('delete', old.id, old.title, old.details); "
+            f"INSERT INTO {fts}(rowid, title, details) "
+            f"VALUES (new.id, new.title, new.details); END"
+        ))
+        if not exists:
+            self.session.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        self.session.commit()
+        return True
+
+    def add(self, product):
+        """Nothing to do, the triggers index every write"""
+
+    def remove(self, product_id):
+        """Nothing to do, the triggers index every write"""
+
+    def clear(self):
+        """Nothing to do, the triggers index every write"""
+
+    def search(self, query: str, limit: int) -> list:
+        """Returns up to limit (product id, score) pairs, best first"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in sorted(terms))
+        rank = f"bm25({self.fts_table}, {TITLE_WEIGHT:.1f}, 1.0)"
+        rows = self.session.execute(
+            text(
+                f"SELECT rowid, -{rank} FROM {self.fts_table} "
+                f"WHERE {self.fts_table} MATCH :match ORDER BY {rank} LIMIT :limit"
+            ),
+            {"match": match, "limit": limit},
+        )
+        return [(row[0], row[1]) for row in rows]
+
+
+class PostgresIndex:
+    """PostgreSQL full-text search over a GIN expression index"""
+
+    def __init__(self, session, table: str):
+        self.session = session
+        self.table = table
+        self.index_name = f"ix_{table}_search"
+        # The 'simple' configuration matches tokenize(): lower-case words,
+        # no stemming and no stop words. Searches must repeat this exact
+        # expression for the planner to use the index.
+        self.document = (
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(details, '')), 'B')"
+        )
+        # ts_rank weights run D, C, B, A: title terms count twice
+        self.weights = f"'{{0, 0, {1 / TITLE_WEIGHT}, 1}}'"
+
+    def install(self) -> bool:
+        """Creates the GIN index unless it exists
+
+        Returns True, as every PostgreSQL has full-text search.
+        """
+        self.session.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {self.index_name} "
+            f"ON {self.table} USING gin (({self.document}))"
+        ))
+        self.session.commit()
+        return True
+
+    def add(self, product):
+        """Nothing to do, the index follows the table"""
+
+    def remove(self, product_id):
+        """Nothing to do, the index follows the table"""
+
+    def clear(self):
+        """Nothing to do, the index follows the table"""
+
+    def search(self, query: str, limit: int) -> list:
+        """Returns up to limit (product id, score) pairs, best first"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        match = " | ".join(f"'{term}'" for term in sorted(terms))
+        rank = f"ts_rank({self.weights}, {self.document}, query)"
+        rows = self.session.execute(
+            text(
+                f"SELECT id, {rank} AS score "
+                f"FROM {self.table}, to_tsquery('simple', :match) AS query "
+                f"WHERE {self.document} @@ query "
+                f"ORDER BY score DESC, id LIMIT :limit"
+            ),
+            {"match": match, "limit": limit},
+        )
+        return [(row[0], row[1]) for row in rows]
+
+
+class SearchIndex:
+    """The full-text index used by ModProduct, whichever backend it is"""
+
+    def __init__(self):
+        self.backend = InvertedIndex()
+
+    def configure(self, session, table: str, rows):
+        """Picks FTS5 on SQLite builds that have it, PostgreSQL full-text
+        search on PostgreSQL, else an inverted index
+
+        ``rows`` is called to fetch id, title and details of every product
+        when the in-process index has to be built.
+        """
+        dialect = session.get_bind().dialect.name
+        if dialect == "sqlite":
+            backend = Fts5Index(session, table)
+            if backend.install():
+                self.backend = backend
+                return
+        if dialect == "postgresql":
+            backend = PostgresIndex(session, table)
+            if backend.install():
+                self.backend = backend
+                return
+        backend = InvertedIndex()
+        backend.rebuild(rows())
+        self.backend = backend
+
+    def add(self, product):
+        """Indexes a created or updated product"""
+        self.backend.add(product)
+
+    def remove(self, product_id):
+        """Removes a deleted product"""
+        self.backend.remove(product_id)
+
+    def clear(self):
+        """Removes every product after the whole catalog is deleted"""
+        self.backend.clear()
+
+    def search(self, query: str, limit: int) -> list:
+        """Returns up to limit (product id, score) pairs, best first"""
+        return self.backend.search(query, limit)
+
+
+search_index = SearchIndex()
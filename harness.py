@@ -0,0 +1,75 @@
+"""
+Test harness
+
+TransactionalTestCase runs every test inside one outer transaction on a
+dedicated connection and rolls it back at teardown, so a test leaves the
+database exactly as it found it without a table-wide DELETE and COMMIT.
+
+The service's own scoped session, a RoutingSession, is configured to bind
+to that connection with ``join_transaction_mode="create_savepoint"``: the
+commit() calls in ModProduct.create/update/delete and the bulk methods
+only release a SAVEPOINT, and their rollback() calls only roll back to
+it. Nothing is ever committed, so test classes can run in parallel
+against one database, and replica routing stays under test.
+
+pysqlite starts and commits transactions on its own, around SAVEPOINT
+too, which would let rows escape the outer transaction. On SQLite the
+test connection therefore follows SQLAlchemy's documented recipe: the
+driver's transaction handling is turned off and BEGIN is emitted
+explicitly.
+
+The catalog is expected to be empty outside of the test transactions;
+empty it once in setUpClass when a database may hold leftovers.
+"""
+import unittest
+from sqlalchemy import event
+from service.cache import product_cache
+from service.catalog import catalog_version
+from service.fulltext import search_index
+from service.models import db
+from service.result_cache import result_cache
+
+
+def _emit_begin(connection):
+    connection.exec_driver_sql("BEGIN")
+
+
+class TransactionalTestCase(unittest.TestCase):
+    """Rolls back everything a test wrote to the database"""
+
+    def setUp(self):
+        """Opens the outer transaction and binds the session to it"""
+        self._connection = db.engine.connect()
+        self._isolation_level = None
+        if self._connection.dialect.name == "sqlite":
+            driver = self._connection.connection.dbapi_connection
+            self._isolation_level = driver.isolation_level
+            driver.isolation_level = None
+            event.listen(self._connection, "begin", _emit_begin)
+        self._transaction = self._connection.begin()
+        db.session.remove()
+        self._session_options = dict(db.session.session_factory.kw)
+        db.session.configure(
+            bind=self._connection, join_transaction_mode="create_savepoint"
+        )
+        product_cache.clear()
+        result_cache.clear()
+
+    def tearDown(self):
+        """Rolls back the outer transaction and restores the session"""
+        db.session.remove()
+        db.session.session_factory.kw.clear()
+        db.session.session_factory.kw.update(self._session_options)
+        self._transaction.rollback()
+        if self._connection.dialect.name == "sqlite":
+            event.remove(self._connection, "begin", _emit_begin)
+            self._connection.connection.dbapi_connection.isolation_level = (
+                self._isolation_level
+            )
+        self._connection.close()
+        # The in-process caches are not part of the transaction
+        result_cache.wait()
+        product_cache.clear()
+        result_cache.clear()
+        search_index.clear()
+        catalog_version.bump()
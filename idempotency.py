@@ -0,0 +1,64 @@
+"""
+Idempotency keys
+
+A client that may retry a create sends an ``Idempotency-Key`` header. The
+key is stored on the product the create makes, under a unique index, and
+the INSERT skips a key that is already there. A retry of POST /products
+therefore gets the product made the first time, in its current state and
+with the ``Idempotent-Replayed: true`` header, instead of a duplicate.
+Deleting the product releases its key. Expired keys are released by an
+indexed UPDATE at most once per sweep interval.
+
+    IDEMPOTENCY_KEY_TTL         seconds a key is remembered (default 86400)
+    IDEMPOTENCY_SWEEP_INTERVAL  seconds between releases of expired keys
+                                (default 300)
+"""
+import time
+import threading
+from service.models import DataValidationError
+from service.repository import product_repository
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 64
+
+
+def idempotency_key(request):
+    """Returns the request's Idempotency-Key, or None when it has none"""
+    key = request.headers.get(HEADER)
+    if key is None:
+        return None
+    if not 0 < len(key) <= MAX_KEY_LENGTH or not key.isascii() or not key.isprintable():
+        raise DataValidationError(
+            f"Invalid {HEADER}: expected 1 to {MAX_KEY_LENGTH} printable ASCII characters"
+        )
+    return key
+
+
+class KeySweeper:
+    """Releases expired keys at most once per interval"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def maybe_sweep(self, interval: float) -> bool:
+        """Releases the expired keys if the interval has passed
+
+        Returns True when this call swept. Concurrent callers do not wait;
+        one of them sweeps.
+        """
+        if self._clock() < self._next_sweep or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._clock() < self._next_sweep:
+                return False
+            self._next_sweep = self._clock() + interval
+            product_repository.expire_idempotency_keys()
+            return True
+        finally:
+            self._lock.release()
+
+
+key_sweeper = KeySweeper()
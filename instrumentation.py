@@ -0,0 +1,249 @@
+"""
+Request instrumentation
+
+configure_instrumentation() times every request phase by phase:
+
+    sql        time spent in cursor.execute(), from SQLAlchemy's
+               before/after_cursor_execute events
+    orm        time in ``timed("query")`` blocks not spent in SQL, that is
+               building ORM instances and rows
+    serialize  time in ``timed("serialize")`` blocks (serialize() and the
+               row encoders)
+    encode     time in json.dumps() behind jsonify()
+    total      the whole request, as the after_request hook sees it
+
+The phases of a request are sent back in a ``Server-Timing`` header and
+added to per-endpoint histograms that GET /metrics renders in the
+Prometheus text format. Streamed bodies are produced after the header is
+sent, so their encoding is not included.
+
+Profiling is opt-in. With PROFILE_SAMPLE_RATE above 0 that fraction of
+requests runs under cProfile, and the profiles of requests slower than
+PROFILE_THRESHOLD_MS are written to PROFILE_DIR as ``.prof`` files. Load
+them with pstats, or turn them into flame graphs with snakeviz or
+flameprof. Only one request is profiled at a time.
+"""
+import os
+import time
+import random
+import cProfile
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from service.pool import LatencyHistogram
+
+logger = logging.getLogger("flask.app")
+
+_timings = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Milliseconds and call counts per phase for one request"""
+
+    def __init__(self):
+        self.milliseconds = {}
+        self.counts = {}
+
+    def add(self, phase: str, milliseconds: float):
+        """Adds one timed call to a phase"""
+        self.milliseconds[phase] = self.milliseconds.get(phase, 0.0) + milliseconds
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def phases(self, total: float) -> dict:
+        """Returns the reported phases and their milliseconds"""
+        sql = self.milliseconds.get("sql", 0.0)
+        phases = {"sql": sql}
+        if "query" in self.milliseconds:
+            phases["orm"] = max(self.milliseconds["query"] - sql, 0.0)
+        for phase in ("serialize", "encode"):
+            if phase in self.milliseconds:
+                phases[phase] = self.milliseconds[phase]
+        phases["total"] = total
+        return phases
+
+
+def record(phase: str, milliseconds: float):
+    """Adds time to a phase of the current request, if one is timed"""
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(phase, milliseconds)
+
+
+@contextmanager
+def timed(phase: str):
+    """Times a block as part of a phase of the current request"""
+    if _timings.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, (time.perf_counter() - start) * 1000)
+
+
+class RequestMetrics:
+    """Latency histograms per endpoint and phase, plus SQL statement counts"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.queries = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint: str, phases: dict, queries: int):
+        """Records the phases of one request"""
+        with self._lock:
+            for phase, milliseconds in phases.items():
+                histogram = self.histograms.get((endpoint, phase))
+                if histogram is None:
+                    histogram = self.histograms[(endpoint, phase)] = LatencyHistogram()
+                histogram.observe(milliseconds)
+            self.queries[endpoint] = self.queries.get(endpoint, 0) + queries
+
+    def clear(self):
+        """Forgets everything recorded so far"""
+        with self._lock:
+            self.histograms.clear()
+            self.queries.clear()
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format"""
+        name = "product_request_phase_milliseconds"
+        lines = [
+            f"# HELP {name} Time spent per request phase",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            queries = sorted(self.queries.items())
+        for (endpoint, phase), histogram in histograms:
+            labels = f'endpoint="{endpoint}",phase="{phase}"'
+            snapshot = histogram.snapshot()
+            cumulative = 0
+            for bound, count in snapshot["buckets"].items():
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {snapshot['mean'] * snapshot['count']:.3f}")
+            lines.append(f"{name}_count{{{labels}}} {snapshot['count']}")
+        lines.append("# HELP product_sql_statements_total SQL statements run per endpoint")
+        lines.append("# TYPE product_sql_statements_total counter")
+        for endpoint, count in queries:
+            lines.append(f'product_sql_statements_total{{endpoint="{endpoint}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """The default JSON provider, timing dumps() as the encode phase"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        with timed("encode"):
+            return super().dumps(obj, **kwargs)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _timings.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if starts:
+        record("sql", (time.perf_counter() - starts.pop()) * 1000)
+
+
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection else None
+    if starts:
+        record("sql", (time.perf_counter() - starts.pop()) * 1000)
+
+
+_profile_lock = threading.Lock()
+
+
+def _start_profile(config):
+    rate = config.get("PROFILE_SAMPLE_RATE", 0.0)
+    if rate <= 0 or random.random() >= rate:
+        return None
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profile(profiler, config, endpoint: str, total: float):
+    profiler.disable()
+    _profile_lock.release()
+    if total < config.get("PROFILE_THRESHOLD_MS", 500):
+        return
+    directory = config.get("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "profiles")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.time():.0f}-{endpoint}-{total:.0f}ms.prof")
+    profiler.dump_stats(path)
+    logger.warning("Profiled a %.0f ms %s request into %s", total, endpoint, path)
+
+
+def _start_request():
+    g.request_timings = RequestTimings()
+    g.timings_token = _timings.set(g.request_timings)
+    g.profiler = _start_profile(current_app.config)
+    g.request_start = time.perf_counter()
+
+
+def _finish_request(response):
+    timings = g.pop("request_timings", None)
+    if timings is None:
+        return response
+    total = (time.perf_counter() - g.pop("request_start")) * 1000
+    endpoint = request.endpoint or "unmatched"
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        _stop_profile(profiler, current_app.config, endpoint, total)
+    phases = timings.phases(total)
+    request_metrics.observe(endpoint, phases, timings.counts.get("sql", 0))
+    if current_app.config.get("SERVER_TIMING", True):
+        response.headers["Server-Timing"] = ", ".join(
+            f"{phase};dur={milliseconds:.2f}" for phase, milliseconds in phases.items()
+        )
+    return response
+
+
+def _end_request(_exc):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:  # the request failed before after_request
+        profiler.disable()
+        _profile_lock.release()
+    token = g.pop("timings_token", None)
+    if token is not None:
+        _timings.reset(token)
+
+
+def configure_instrumentation(app):
+    """Installs the SQL timing events, request hooks and JSON timer
+
+    Safe to call more than once; the hooks are only registered the first
+    time.
+    """
+    if "instrumentation" in app.extensions:
+        return
+    app.extensions["instrumentation"] = request_metrics
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+    if type(app.json) is DefaultJSONProvider:  # pylint: disable=unidiomatic-typecheck
+        provider = TimedJSONProvider(app)
+        provider.__dict__.update(app.json.__dict__)
+        app.json = provider
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
@@ -0,0 +1,147 @@
+"""
+Logging pipeline
+
+configure_logging() moves the handlers of the app logger behind a
+QueueHandler. Request threads only merge the arguments into the message,
+so later changes to them cannot show, and put records on a bounded queue.
+A QueueListener thread formats them, timestamps, JSON and tracebacks
+included, and does the I/O. When the queue is full, records are dropped
+and counted instead of blocking the request.
+
+    LOG_LEVEL         level of the app logger, when set
+    LOG_FORMAT        "text" (default) or "json", one object per line
+    LOG_QUEUE_SIZE    records held before new ones are dropped (default 10000)
+    LOG_SAMPLE_RATE   fraction of DEBUG and INFO records kept (default 1.0)
+    LOG_SAMPLE_RATES  per-endpoint fractions, e.g. {"get_products": 0.01}
+
+Warnings and errors are never sampled away. The per-operation messages of
+ModProduct and the repositories are logged at DEBUG, so at the default
+level they cost one isEnabledFor() check.
+"""
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from flask import has_request_context, request
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of DEBUG and INFO records, per endpoint"""
+
+    def __init__(self, rate: float = 1.0, rates: dict = None):
+        super().__init__()
+        self.rate = rate
+        self.rates = rates or {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate
+        if self.rates and has_request_context():
+            rate = self.rates.get(request.endpoint, rate)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """A QueueHandler that drops records rather than wait for room"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    """A QueueListener that can be stopped twice and waits to stop on a full queue"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        endpoint = getattr(record, "endpoint", None)
+        if endpoint:
+            entry["endpoint"] = endpoint
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class _EndpointHandler(DroppingQueueHandler):
+    """Notes the endpoint on the record while the request is still current"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare() would format the record here and drop its
+        # exc_info; the queue stays in the process, so leave both to the
+        # listener and only snapshot the arguments
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if has_request_context():
+            record.endpoint = request.endpoint
+        return record
+
+
+def configure_logging(app):
+    """Puts the app logger's handlers behind a queue
+
+    Safe to call more than once; the pipeline is only built the first time.
+    Returns the QueueListener, which is stopped, flushing the queue, at exit,
+    or None when the logger has no handlers of its own to move.
+    """
+    if "log_pipeline" in app.extensions:
+        return app.extensions["log_pipeline"]
+    config = app.config
+    if "LOG_LEVEL" in config:
+        app.logger.setLevel(config["LOG_LEVEL"])
+    handlers = app.logger.handlers[:]
+    if not handlers:
+        # Nothing of its own to move; records keep propagating as before
+        app.extensions["log_pipeline"] = None
+        return None
+    if config.get("LOG_FORMAT", "text") == "json":
+        for handler in handlers:
+            handler.setFormatter(JsonFormatter())
+    for handler in handlers:
+        app.logger.removeHandler(handler)
+
+    handler = _EndpointHandler(queue.Queue(config.get("LOG_QUEUE_SIZE", 10000)))
+    handler.addFilter(
+        SamplingFilter(config.get("LOG_SAMPLE_RATE", 1.0), config.get("LOG_SAMPLE_RATES"))
+    )
+    app.logger.addHandler(handler)
+    listener = _Listener(handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    app.extensions["log_pipeline"] = listener
+    return listener
+
+
+def dropped_records(app) -> int:
+    """Returns how many records the app logger dropped on a full queue"""
+    return sum(
+        handler.dropped
+        for handler in app.logger.handlers
+        if isinstance(handler, DroppingQueueHandler)
+    )
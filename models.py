@@ -1,24 +1,87 @@
+import hashlib
 import logging
 from enum import Enum
 from decimal import Decimal
+from datetime import datetime, timedelta, timezone
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import bindparam, insert, inspect, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.schema import CreateColumn
+from service.cache import configure_cache, product_cache
+from service.catalog import catalog_version
+from service.fulltext import search_index
+from service.instrumentation import configure_instrumentation
+from service.log_pipeline import configure_logging
+from service.pool import configure_pool
+from service.replica import RoutingSession, configure_replicas, read_only
+from service.result_cache import configure_result_cache
 
 logger = logging.getLogger("flask.app")
 
 # Create the SQLAlchemy object to be initialized later in init_db()
-db = SQLAlchemy()
+# Its sessions send read-only queries to the replicas, if any
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+# INSERT statements that can skip rows clashing with a unique index
+INSERT_IGNORING_CONFLICTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
 
 
 def initialize_db(app):
-    """Initialize the SQLAlchemy app"""
-    ModProduct.initialize_db(app)
+    """Initialize the product repository named by PRODUCT_REPOSITORY
+
+    The default "sql" repository initializes the SQLAlchemy app.
+    """
+    # The repository module builds on this one
+    from service.repository import initialize_repository  # pylint: disable=import-outside-toplevel
+    initialize_repository(app)
+
+
+def configure_services(app):
+    """Sets up the caches, instrumentation and logging
+
+    Every product repository needs them, with or without a database.
+    """
+    configure_cache(app)
+    configure_result_cache(app)
+    configure_instrumentation(app)
+    configure_logging(app)
+
+
+def _utcnow() -> datetime:
+    """Returns the current UTC time without a zone, as DateTime columns hold it"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def content_hash(values: dict) -> str:
+    """Returns the hash catalog sync compares to tell a changed product
+
+    values holds the title, details, cost, available and category of a
+    product; costs that are equal as numbers hash the same.
+    """
+    cost = format(Decimal(values["cost"]).normalize(), "f")
+    text = "\x1f".join((
+        values["title"],
+        values["details"],
+        cost,
+        "1" if values["available"] else "0",
+        values["category"].name,
+    ))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
 
 
 class DataValidationError(Exception):
     """Used for data validation errors when deserializing"""
 
 
+class UnsupportedOperation(Exception):
+    """Used for operations the configured backend or database cannot serve"""
+
+
 class ProductCategory(Enum):
     """Enumeration of valid Product Categories"""
 
@@ -51,6 +114,34 @@ class ModProduct(db.Model):
         nullable=False,
         server_default=(ProductCategory.UNKNOWN.name),
     )
+    # Incremented on every write; used for optimistic concurrency control
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # The Idempotency-Key of the request that created the product, kept
+    # until it expires so that a retried create finds this product.
+    # Deleting the product releases its key.
+    idempotency_key = db.Column(db.String(100), nullable=True)
+    idempotency_expires = db.Column(db.DateTime, nullable=True)
+    # The supplier's key for products kept in step by catalog sync, and the
+    # content_hash() of the fields it last wrote
+    sku = db.Column(db.String(64), nullable=True)
+    content_hash = db.Column(db.String(32), nullable=True)
+
+    __mapper_args__ = {"version_id_col": version}
+
+    # One index per find_by_* access path. The composite index also serves
+    # find_by_category() through its leading column and answers combined
+    # category + availability filters and counts without touching the table.
+    __table_args__ = (
+        db.Index("ix_mod_product_title", "title"),
+        db.Index("ix_mod_product_cost", "cost"),
+        db.Index("ix_mod_product_available", "available"),
+        db.Index("ix_mod_product_category_available", "category", "available"),
+        # Unique, so that INSERT ... ON CONFLICT DO NOTHING claims the key
+        db.Index("ix_mod_product_idempotency_key", "idempotency_key", unique=True),
+        # Lets the expired-key sweep find its rows without a table scan
+        db.Index("ix_mod_product_idempotency_expires", "idempotency_expires"),
+        db.Index("ix_mod_product_sku", "sku", unique=True),
+    )
 
     ##################################################
     # INSTANCE METHODS
@@ -61,23 +152,41 @@ class ModProduct(db.Model):
 
     def create(self):
         """Creates a Modified Product in the database"""
-        logger.info("Creating %s", self.title)
+        logger.debug("Creating %s", self.title)
         self.id = None
         db.session.add(self)
         db.session.commit()
+        catalog_version.bump()
+        search_index.add(self)
 
     def update(self):
         """Updates a Modified Product in the database"""
-        logger.info("Saving %s", self.title)
+        logger.debug("Saving %s", self.title)
         if not self.id:
             raise DataValidationError("Update called with empty ID field")
-        db.session.commit()
+        if self.sku is not None:
+            self.content_hash = content_hash({
+                field: getattr(self, field)
+                for field in ("title", "details", "cost", "available", "category")
+            })
+        try:
+            db.session.commit()
+        except StaleDataError:
+            # Another request changed the product since it was read
+            db.session.rollback()
+            raise
+        catalog_version.bump()
+        product_cache.invalidate(self.id)
+        search_index.add(self)
 
     def delete(self):
         """Removes a Modified Product from the data store"""
-        logger.info("Deleting %s", self.title)
+        logger.debug("Deleting %s", self.title)
         db.session.delete(self)
         db.session.commit()
+        catalog_version.bump()
+        product_cache.invalidate(self.id)
+        search_index.remove(self.id)
 
     def serialize(self) -> dict:
         """Serializes a Modified Product into a dictionary"""
@@ -88,6 +197,7 @@ class ModProduct(db.Model):
             "cost": str(self.cost),
             "available": self.available,
             "category": self.category.name,
+            "version": self.version,
         }
 
     def deserialize(self, data: dict):
@@ -95,7 +205,10 @@ class ModProduct(db.Model):
         try:
             self.title = data["title"]
             self.details = data["details"]
-            self.cost = Decimal(data["cost"])
+            try:
+                self.cost = Decimal(data["cost"])
+            except (ArithmeticError, TypeError, ValueError) as error:
+                raise DataValidationError("Invalid value for [cost]") from error
             if isinstance(data["available"], bool):
                 self.available = data["available"]
             else:
@@ -124,32 +237,571 @@ class ModProduct(db.Model):
     def initialize_db(cls, app: Flask):
         """Initializes the database session"""
         logger.info("Initializing database")
+        configure_pool(app)
         db.init_app(app)
+        configure_replicas(app)
+        configure_services(app)
         app.app_context().push()
         db.create_all()
+        cls.migrate()
+        search_index.configure(
+            db.session,
+            cls.__tablename__,
+            lambda: db.session.query(cls.id, cls.title, cls.details).yield_per(1000),
+        )
+
+    @classmethod
+    def migrate(cls):
+        """Brings a database created by an older version up to date
+
+        create_all() only creates missing tables, so columns and indexes
+        added to an existing table are created here. Every step is
+        idempotent.
+        """
+        logger.info("Migrating database schema")
+        table = cls.__table__
+        existing = {column["name"] for column in inspect(db.engine).get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+                with db.engine.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+    @classmethod
+    def create_once(cls, product, key: str, ttl: float = 86400.0) -> tuple:
+        """Creates a Modified Product unless key was used by an earlier create
+
+        Returns the product and whether it was created now. For a key that
+        was already used, the product its first create made is read back
+        and returned instead, in its current state rather than as first
+        created. The key lives on that product, so deleting the product
+        releases it and the next create with the key makes a new product.
+        """
+        logger.debug("Creating %s once for key %s", product.title, key)
+        while True:
+            ((product_id, created),) = cls._insert_once([(key, product)], ttl)
+            if created:
+                return product, True
+            existing = cls.find(product_id) if product_id else None
+            if existing is not None:
+                return existing, False
+            # Deleted since the INSERT found its key, which released the key
+
+    @classmethod
+    def _insert_once(cls, keyed: list, ttl: float) -> list:
+        """Inserts (key, product) pairs, skipping keys that are already used
+
+        The INSERT claims the keys itself through ON CONFLICT DO NOTHING on
+        the unique key column, so a first attempt costs no extra query; only
+        replays read back the ids their keys point to. Keys that expired
+        but were not swept yet are released and inserted again. Returns the
+        id of every pair, in order, and whether it was inserted now.
+        """
+        table = cls.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect not in INSERT_IGNORING_CONFLICTS:
+            raise UnsupportedOperation(f"Idempotency keys are not supported on {dialect}")
+        now = _utcnow()
+        expires = now + timedelta(seconds=ttl)
+        rows = {
+            key: {
+                "title": product.title,
+                "details": product.details,
+                "cost": product.cost,
+                "available": product.available,
+                "category": product.category,
+                "version": 1,
+                "idempotency_key": key,
+                "idempotency_expires": expires,
+            }
+            for key, product in keyed
+        }
+        statement = (
+            INSERT_IGNORING_CONFLICTS[dialect](table)
+            .on_conflict_do_nothing(index_elements=[table.c.idempotency_key])
+            .returning(table.c.id, table.c.idempotency_key)
+        )
+        created, replayed = {}, {}
+        try:
+            pending = list(rows)
+            for _ in range(2):
+                outcome = db.session.execute(statement, [rows[key] for key in pending])
+                created.update((key, product_id) for product_id, key in outcome)
+                pending = [key for key in pending if key not in created]
+                if not pending:
+                    break
+                expired = []
+                for product_id, key, expires_at in db.session.query(
+                    cls.id, cls.idempotency_key, cls.idempotency_expires
+                ).filter(cls.idempotency_key.in_(pending)):
+                    if expires_at is not None and expires_at <= now:
+                        expired.append(product_id)
+                    else:
+                        replayed[key] = product_id
+                pending = [key for key in pending if key not in replayed]
+                if not expired:
+                    break
+                cls._release_keys(cls.id.in_(expired))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        outcomes = []
+        for key, product in keyed:
+            if key in created:
+                product.id, product.version = created[key], 1
+                search_index.add(product)
+                outcomes.append((product.id, True))
+            else:
+                outcomes.append((replayed.get(key), False))
+        if created:
+            catalog_version.bump()
+        return outcomes
+
+    @classmethod
+    def _release_keys(cls, criterion) -> int:
+        return (
+            db.session.query(cls)
+            .filter(criterion)
+            .update(
+                {cls.idempotency_key: None, cls.idempotency_expires: None},
+                synchronize_session=False,
+            )
+        )
+
+    @classmethod
+    def expire_idempotency_keys(cls) -> int:
+        """Forgets the idempotency keys past their expiry
+
+        Returns the number of keys released.
+        """
+        logger.info("Releasing expired idempotency keys ...")
+        try:
+            count = cls._release_keys(cls.idempotency_expires <= _utcnow())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return count
+
+    @classmethod
+    def create_all(cls, items, chunk_size: int = 500,
+                   idempotency_key: str = None, ttl: float = 86400.0) -> list:
+        """Creates Modified Products in bulk, committing once per chunk
+
+        Every item is validated with deserialize() before it is queued, so a
+        bad item is reported and skipped without failing the rest of the
+        batch. Returns one result per item, in order, holding either the
+        new ``id`` or the validation ``error``.
+
+        With an idempotency_key every item is created once under
+        ``<key>:<index>``; items a retry had already created are returned
+        with their existing ``id`` and ``replayed`` set.
+        """
+        logger.info("Processing bulk create in chunks of %s ...", chunk_size)
+        results = []
+        pending = []
+        for index, data in enumerate(items):
+            try:
+                product = cls().deserialize(data)
+            except DataValidationError as error:
+                results.append({"index": index, "error": str(error)})
+                continue
+            result = {"index": index, "id": None}
+            results.append(result)
+            pending.append((result, product))
+            if len(pending) >= chunk_size:
+                cls._insert_chunk(pending, idempotency_key, ttl)
+                pending = []
+        if pending:
+            cls._insert_chunk(pending, idempotency_key, ttl)
+        return results
+
+    @classmethod
+    def _insert_chunk(cls, pending: list, idempotency_key: str = None, ttl: float = 86400.0):
+        """Inserts one chunk of validated products in a single transaction"""
+        if idempotency_key is not None:
+            outcomes = cls._insert_once(
+                [(f"{idempotency_key}:{result['index']}", product) for result, product in pending],
+                ttl,
+            )
+            for (result, _), (product_id, created) in zip(pending, outcomes):
+                result["id"] = product_id
+                if not created:
+                    result["replayed"] = True
+            return
+        try:
+            db.session.bulk_save_objects(
+                [product for _, product in pending], return_defaults=True
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        catalog_version.bump()
+        for result, product in pending:
+            result["id"] = product.id
+            search_index.add(product)
+
+    @classmethod
+    def delete_all(cls, query=None) -> int:
+        """Removes every Modified Product matched by query with one DELETE
+
+        Without a query the whole catalog is removed. Returns the number of
+        products deleted.
+        """
+        logger.info("Processing bulk delete ...")
+        ids = None
+        if query is not None:
+            ids = [product_id for (product_id,) in query.with_entities(cls.id)]
+        else:
+            query = cls.query
+        try:
+            count = query.delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        cls._unindex(ids)
+        return count
+
+    @classmethod
+    def delete_ids(cls, ids: list, chunk_size: int = 1000) -> int:
+        """Removes the Modified Products with the given ids in one transaction
+
+        Returns the number of products deleted; ids that do not exist are
+        ignored.
+        """
+        logger.info("Processing bulk delete by id ...")
+        ids = list(dict.fromkeys(ids))
+        count = 0
+        try:
+            for start in range(0, len(ids), chunk_size):
+                chunk = ids[start:start + chunk_size]
+                count += cls.query.filter(cls.id.in_(chunk)).delete(
+                    synchronize_session=False
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        cls._unindex(ids)
+        return count
+
+    @classmethod
+    def _unindex(cls, ids: list = None):
+        """Drops deleted products from the cache and search index
+
+        ``None`` means every product was deleted.
+        """
+        catalog_version.bump()
+        if ids is None:
+            product_cache.clear()
+            search_index.clear()
+            return
+        for product_id in ids:
+            product_cache.invalidate(product_id)
+            search_index.remove(product_id)
+
+    @classmethod
+    def validate_patch(cls, data: dict) -> dict:
+        """Validates a partial update and returns the column values it sets
+
+        Any of title, details, cost, available and category may be given;
+        each is checked the same way deserialize() checks it.
+        """
+        if not isinstance(data, dict):
+            raise DataValidationError(
+                "Invalid product: body of request contained bad or no data"
+            )
+        values = {}
+        for field in ("title", "details"):
+            if field in data:
+                if not isinstance(data[field], str):
+                    raise DataValidationError(f"Invalid type for string [{field}]")
+                values[field] = data[field]
+        if "cost" in data:
+            try:
+                values["cost"] = Decimal(data["cost"])
+            except (ArithmeticError, TypeError, ValueError) as error:
+                raise DataValidationError("Invalid value for [cost]") from error
+        if "available" in data:
+            if not isinstance(data["available"], bool):
+                raise DataValidationError(
+                    "Invalid type for boolean [available]: "
+                    + str(type(data["available"]))
+                )
+            values["available"] = data["available"]
+        if "category" in data:
+            category = getattr(ProductCategory, str(data["category"]), None)
+            if not isinstance(category, ProductCategory):
+                raise DataValidationError("Invalid attribute: " + str(data["category"]))
+            values["category"] = category
+        if not values:
+            raise DataValidationError("Invalid patch: no fields to update")
+        return values
+
+    @classmethod
+    def update_all(cls, patches, chunk_size: int = 500) -> list:
+        """Applies partial updates in bulk, committing once per chunk
+
+        Each patch holds the ``id`` to change, optionally the ``version`` it
+        was read at, and the fields to set. A patch whose version is stale is
+        rejected rather than overwriting a newer write. Returns one result
+        per patch, in order, with an HTTP-style ``status`` and either the
+        new ``version`` or an ``error``.
+        """
+        logger.info("Processing bulk update in chunks of %s ...", chunk_size)
+        results = []
+        pending = []
+        seen = set()
+        for index, data in enumerate(patches):
+            product_id = data.get("id") if isinstance(data, dict) else None
+            result = {"index": index, "id": product_id}
+            results.append(result)
+            try:
+                if not isinstance(product_id, int) or isinstance(product_id, bool):
+                    raise DataValidationError("Invalid patch: missing id")
+                if product_id in seen:
+                    raise DataValidationError("Invalid patch: duplicate id in batch")
+                version = data.get("version")
+                if version is not None and (
+                    not isinstance(version, int) or isinstance(version, bool)
+                ):
+                    raise DataValidationError("Invalid patch: version must be an integer")
+                values = cls.validate_patch(
+                    {k: v for k, v in data.items() if k not in ("id", "version")}
+                )
+            except DataValidationError as error:
+                result.update(status=400, error=str(error))
+                continue
+            seen.add(product_id)
+            pending.append((result, data.get("version"), values))
+            if len(pending) >= chunk_size:
+                cls._update_chunk(pending)
+                pending = []
+        if pending:
+            cls._update_chunk(pending)
+        return results
+
+    @classmethod
+    def _update_chunk(cls, pending: list):
+        """Applies one chunk of patches with set-based UPDATE statements
+
+        The current versions of the chunk are read and locked with one
+        SELECT; patches touching the same columns then share one
+        executemany UPDATE guarded by the version.
+        """
+        table = cls.__table__
+        ids = [result["id"] for result, _, _ in pending]
+        try:
+            current = dict(
+                db.session.query(cls.id, cls.version)
+                .filter(cls.id.in_(ids))
+                .with_for_update()
+            )
+            groups = {}
+            for result, expected, values in pending:
+                version = current.get(result["id"])
+                if version is None:
+                    result.update(status=404, error="Product not found")
+                elif expected is not None and expected != version:
+                    result.update(status=409, error=f"Version conflict: current is {version}")
+                else:
+                    result.update(status=200, version=version + 1)
+                    params = {f"b_{key}": value for key, value in values.items()}
+                    params.update(b_id=result["id"], b_version=version)
+                    groups.setdefault(tuple(sorted(values)), []).append(params)
+            for fields, params in groups.items():
+                assignments = {field: bindparam(f"b_{field}") for field in fields}
+                assignments["version"] = table.c.version + 1
+                # Let the next catalog sync write these products again
+                assignments["content_hash"] = None
+                statement = (
+                    update(table)
+                    .where(table.c.id == bindparam("b_id"))
+                    .where(table.c.version == bindparam("b_version"))
+                    .values(assignments)
+                )
+                outcome = db.session.execute(statement, params)
+                if outcome.rowcount not in (-1, len(params)):
+                    # A writer the row lock did not hold off got in first
+                    db.session.rollback()
+                    for result, _, _ in pending:
+                        if result["status"] == 200:
+                            del result["version"]
+                            result.update(status=409, error="Concurrent update, retry")
+                    return
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        updated = [
+            (result["id"], values)
+            for result, _, values in pending
+            if result["status"] == 200
+        ]
+        cls._reindex(
+            [product_id for product_id, _ in updated],
+            [
+                product_id
+                for product_id, values in updated
+                if "title" in values or "details" in values
+            ],
+        )
+
+    @classmethod
+    def sync(cls, items, chunk_size: int = 500, prune: bool = True) -> dict:
+        """Brings the products keyed by ``sku`` in step with a full feed
+
+        Each item holds a ``sku`` and every product field. The stored
+        content hashes are read with one scan; only items whose hash
+        differs are written, through set-based INSERTs and UPDATEs
+        committed once per chunk, so an unchanged feed writes nothing.
+        With prune, products whose sku is missing from the feed are
+        deleted. Products without a sku are never touched. Returns the
+        counts of what was done and the per-item validation errors.
+        """
+        logger.info("Processing catalog sync in chunks of %s ...", chunk_size)
+        stored = {
+            sku: (product_id, digest)
+            for sku, product_id, digest in db.session.query(
+                cls.sku, cls.id, cls.content_hash
+            ).filter(cls.sku.isnot(None)).yield_per(10000)
+        }
+        summary = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "errors": []}
+        inserts, updates = [], []
+        seen = set()
+        for index, data in enumerate(items):
+            sku = data.get("sku") if isinstance(data, dict) else None
+            try:
+                if not isinstance(sku, str) or not 0 < len(sku) <= 64:
+                    raise DataValidationError("Invalid item: sku must be 1 to 64 characters")
+                if sku in seen:
+                    raise DataValidationError("Invalid item: duplicate sku in feed")
+                seen.add(sku)
+                # A bad row leaves its product as it is instead of pruning it
+                current = stored.pop(sku, None)
+                missing = [
+                    field for field in ("title", "details", "cost", "available", "category")
+                    if field not in data
+                ]
+                if missing:
+                    raise DataValidationError("Invalid product: missing " + ", ".join(missing))
+                values = cls.validate_patch({k: v for k, v in data.items() if k != "sku"})
+            except DataValidationError as error:
+                summary["errors"].append({"index": index, "sku": sku, "error": str(error)})
+                continue
+            digest = content_hash(values)
+            if current is None:
+                inserts.append(dict(values, sku=sku, content_hash=digest, version=1))
+            elif current[1] == digest:
+                summary["unchanged"] += 1
+            else:
+                params = {f"b_{key}": value for key, value in values.items()}
+                params.update(b_id=current[0], b_content_hash=digest)
+                updates.append(params)
+            if len(inserts) >= chunk_size:
+                summary["inserted"] += cls._sync_inserts(inserts)
+                inserts = []
+            if len(updates) >= chunk_size:
+                summary["updated"] += cls._sync_updates(updates)
+                updates = []
+        if inserts:
+            summary["inserted"] += cls._sync_inserts(inserts)
+        if updates:
+            summary["updated"] += cls._sync_updates(updates)
+        if prune and stored:
+            summary["deleted"] = cls.delete_ids(
+                [product_id for product_id, _ in stored.values()], chunk_size
+            )
+        return summary
+
+    @classmethod
+    def _sync_inserts(cls, rows: list) -> int:
+        """Inserts one chunk of new feed items with a single executemany"""
+        table = cls.__table__
+        statement = insert(table).returning(table.c.id, table.c.title, table.c.details)
+        try:
+            created = db.session.execute(statement, rows).all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        catalog_version.bump()
+        for row in created:
+            search_index.add(row)
+        return len(created)
 
     @classmethod
+    def _sync_updates(cls, params: list) -> int:
+        """Rewrites one chunk of changed products with a single executemany"""
+        table = cls.__table__
+        assignments = {
+            field: bindparam(f"b_{field}")
+            for field in ("title", "details", "cost", "available", "category", "content_hash")
+        }
+        assignments["version"] = table.c.version + 1
+        statement = (
+            update(table).where(table.c.id == bindparam("b_id")).values(assignments)
+        )
+        try:
+            db.session.execute(statement, params)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        ids = [param["b_id"] for param in params]
+        cls._reindex(ids, ids)
+        return len(params)
+
+    @classmethod
+    def _reindex(cls, ids: list, text_ids: list = ()):
+        """Refreshes the product cache and search index after a set-based write
+
+        ``ids`` are dropped from the cache; ``text_ids`` had their title or
+        details changed and are indexed again.
+        """
+        catalog_version.bump()
+        for product_id in ids:
+            product_cache.invalidate(product_id)
+        if text_ids:
+            rows = db.session.query(cls.id, cls.title, cls.details).filter(
+                cls.id.in_(text_ids)
+            )
+            for row in rows:
+                search_index.add(row)
+
+    @classmethod
+    @read_only
     def all(cls) -> list:
         """Returns all of the Modified Products in the database"""
-        logger.info("Processing all Modified Products")
+        logger.debug("Processing all Modified Products")
         return cls.query.all()
 
     @classmethod
     def find(cls, product_id: int):
         """Finds a Modified Product by its ID"""
-        logger.info("Processing lookup for id %s ...", product_id)
+        logger.debug("Processing lookup for id %s ...", product_id)
         return cls.query.get(product_id)
 
+    @classmethod
+    def find_cached(cls, product_id: int):
+        """Finds a serialized Modified Product through the product cache"""
+        return product_cache.get(product_id, cls.find)
+
     @classmethod
     def find_by_name(cls, name: str) -> list:
         """Returns all Modified Products with the given name"""
-        logger.info("Processing name query for %s ...", name)
+        logger.debug("Processing name query for %s ...", name)
         return cls.query.filter(cls.title == name)
 
     @classmethod
     def find_by_price(cls, price: Decimal) -> list:
         """Returns all Modified Products with the given price"""
-        logger.info("Processing price query for %s ...", price)
+        logger.debug("Processing price query for %s ...", price)
         price_value = price
         if isinstance(price, str):
             price_value = Decimal(price.strip(' "'))
@@ -158,11 +810,72 @@ class ModProduct(db.Model):
     @classmethod
     def find_by_availability(cls, available: bool = True) -> list:
         """Returns all Modified Products by their availability"""
-        logger.info("Processing available query for %s ...", available)
+        logger.debug("Processing available query for %s ...", available)
         return cls.query.filter(cls.available == available)
 
     @classmethod
     def find_by_category(cls, category: ProductCategory = ProductCategory.UNKNOWN) -> list:
         """Returns all Modified Products by their Category"""
-        logger.info("Processing category query for %s ...", category.name)
+        logger.debug("Processing category query for %s ...", category)
         return cls.query.filter(cls.category == category)
+
+    @classmethod
+    @read_only
+    def search_text(cls, text_query: str, limit: int = 20) -> list:
+        """Returns the Modified Products best matching a full-text query
+
+        Products are ranked by the full-text index, best match first, and
+        only the ranked ids are read from the database.
+        """
+        logger.debug("Processing full-text query for %s ...", text_query)
+        ranked = search_index.search(text_query, limit)
+        if not ranked:
+            return []
+        ids = [product_id for product_id, _ in ranked]
+        products = {product.id: product for product in cls.query.filter(cls.id.in_(ids))}
+        return [products[product_id] for product_id in ids if product_id in products]
+
+    @classmethod
+    def search(
+        cls,
+        name: str = None,
+        category: ProductCategory = None,
+        available: bool = None,
+        min_cost: Decimal = None,
+        max_cost: Decimal = None,
+    ):
+        """Returns the Modified Products matching every given filter
+
+        All of the filters are combined into a single SELECT.
+        """
+        logger.debug("Processing search query ...")
+        return cls.query.filter(
+            *cls.search_criteria(name, category, available, min_cost, max_cost)
+        )
+
+    @classmethod
+    def search_criteria(
+        cls,
+        name: str = None,
+        category: ProductCategory = None,
+        available: bool = None,
+        min_cost: Decimal = None,
+        max_cost: Decimal = None,
+    ) -> list:
+        """Returns the WHERE criteria of search()
+
+        They are the predicates of the matching find_by_* queries and can be
+        used in any select() of the product table, with or without a session.
+        """
+        criteria = []
+        if name is not None:
+            criteria.append(cls.title == name)
+        if category is not None:
+            criteria.append(cls.category == category)
+        if available is not None:
+            criteria.append(cls.available == available)
+        if min_cost is not None:
+            criteria.append(cls.cost >= min_cost)
+        if max_cost is not None:
+            criteria.append(cls.cost <= max_cost)
+        return criteria
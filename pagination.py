@@ -0,0 +1,135 @@
+"""
+Keyset pagination helpers
+
+Pages are walked in ``id`` order, or in the order of a sort column with
+``id`` as the tie breaker. The cursor is an opaque, URL-safe token holding
+the position of the last row of the previous page, so every page is one
+indexed range scan instead of an OFFSET that rereads all of the skipped
+rows.
+"""
+import json
+import base64
+import binascii
+from sqlalchemy import tuple_
+
+
+class PaginationError(Exception):
+    """Used for invalid limit or cursor query parameters"""
+
+
+def encode_cursor(position: list) -> str:
+    """Encodes the position of the last row on a page as an opaque cursor"""
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Decodes a cursor produced by encode_cursor()"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, ValueError) as error:
+        raise PaginationError("Invalid cursor: " + cursor) from error
+    if not isinstance(position, list) or not position:
+        raise PaginationError("Invalid cursor: " + cursor)
+    return position
+
+
+def parse_limit(value, default: int, maximum: int) -> int:
+    """Validates the ``limit`` query parameter against the configured cap"""
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError as error:
+        raise PaginationError("Invalid limit: " + value) from error
+    if limit < 1:
+        raise PaginationError("Invalid limit: must be at least 1")
+    if limit > maximum:
+        raise PaginationError(f"Invalid limit: must not exceed {maximum}")
+    return limit
+
+
+def paginate(query, model, limit: int, cursor: str = None,
+             sort_column=None, descending: bool = False) -> tuple:
+    """Returns one page of ``query`` and the cursor for the next page
+
+    Rows are ordered by ``sort_column`` (``id`` when not given) with ``id``
+    as the tie breaker, and the cursor holds both values of the last row.
+    The next cursor is None on the last page. One extra row is fetched to
+    find out whether another page exists without issuing a COUNT.
+    """
+    query, keys = page_query(query, model, limit, cursor, sort_column, descending)
+    return page_items(query.all(), keys, limit)
+
+
+def page_query(query, model, limit: int, cursor: str = None,
+               sort_column=None, descending: bool = False) -> tuple:
+    """Narrows a query or select() to one page, see paginate()
+
+    Returns the statement and the sort keys to hand to page_items() with
+    the rows it returns.
+    """
+    keys = _sort_keys(model, sort_column)
+    if cursor:
+        values = _cursor_values(keys, cursor)
+        if descending:
+            query = query.filter(tuple_(*keys) < values)
+        else:
+            query = query.filter(tuple_(*keys) > values)
+    order = [key.desc() if descending else key.asc() for key in keys]
+    return query.order_by(*order).limit(limit + 1), keys
+
+
+def paginate_items(items: list, model, limit: int, cursor: str = None,
+                   sort_column=None, descending: bool = False) -> tuple:
+    """Returns one page of a list of products, see paginate()
+
+    The in-memory counterpart of paginate(), taking and handing out the
+    same cursors.
+    """
+    keys = _sort_keys(model, sort_column)
+
+    def position(item):
+        return tuple(getattr(item, key.key) for key in keys)
+
+    items = sorted(items, key=position, reverse=descending)
+    if cursor:
+        values = _cursor_values(keys, cursor)
+        if descending:
+            items = [item for item in items if position(item) < values]
+        else:
+            items = [item for item in items if position(item) > values]
+    return page_items(items[:limit + 1], keys, limit)
+
+
+def _sort_keys(model, sort_column) -> tuple:
+    if sort_column is None or sort_column.key == model.id.key:
+        return (model.id,)
+    return (sort_column, model.id)
+
+
+def _cursor_values(keys: tuple, cursor: str) -> tuple:
+    position = decode_cursor(cursor)
+    if len(position) != len(keys):
+        raise PaginationError("Invalid cursor: " + cursor)
+    try:
+        return tuple(key.type.python_type(value) for key, value in zip(keys, position))
+    except (TypeError, ValueError, ArithmeticError) as error:
+        raise PaginationError("Invalid cursor: " + cursor) from error
+
+
+def page_items(items: list, keys: tuple, limit: int) -> tuple:
+    """Returns the page and next cursor from the rows of page_query()"""
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = [getattr(items[-1], key.key) for key in keys]
+    return items, encode_cursor([_json_value(value) for value in last])
+
+
+def _json_value(value):
+    """Returns a cursor value in a form JSON can carry without loss"""
+    if isinstance(value, (int, str)):
+        return value
+    return str(value)
@@ -0,0 +1,160 @@
+"""
+Connection pool
+
+configure_pool() turns the DB_* settings into the SQLAlchemy engine
+options used by db.init_app():
+
+    DB_POOL_SIZE          connections kept open (default 5)
+    DB_MAX_OVERFLOW       extra connections opened under load (default 10)
+    DB_POOL_TIMEOUT       seconds to wait for a free connection (default 30)
+    DB_POOL_PRE_PING      test connections before handing them out (default False)
+    DB_POOL_RECYCLE       seconds before a connection is replaced (default 1800)
+    DB_STATEMENT_TIMEOUT  milliseconds before PostgreSQL cancels a statement
+
+The pre-ping costs a round trip on every checkout. DB_POOL_RECYCLE already
+replaces connections before common idle timeouts; turn DB_POOL_PRE_PING on
+when something can drop connections sooner, such as a database failover or
+restart, or a proxy or firewall with a shorter idle timeout.
+
+Options already present in SQLALCHEMY_ENGINE_OPTIONS win. The engine uses
+TimedQueuePool, which records how long every checkout waited, so pool
+pile-ups show up in pool_stats() instead of as unexplained latency.
+"""
+import time
+import bisect
+import threading
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds of the checkout latency buckets, in milliseconds
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Counts latencies into fixed buckets"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, milliseconds: float):
+        """Records one latency"""
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, milliseconds)] += 1
+            self.count += 1
+            self.total += milliseconds
+            self.max = max(self.max, milliseconds)
+
+    def percentile(self, fraction: float) -> float:
+        """Returns the bucket bound below which fraction of latencies fall"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = fraction * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= rank:
+                    return min(bound, self.max)
+            return self.max
+
+    def snapshot(self) -> dict:
+        """Returns the buckets and summary figures"""
+        with self._lock:
+            buckets = {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+            buckets["+Inf"] = self.counts[-1]
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            "count": count,
+            "mean": total / count if count else 0.0,
+            "p50": self.percentile(0.50),
+            "p99": self.percentile(0.99),
+            "max": maximum,
+            "buckets": buckets,
+        }
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool that measures checkout latency and timeouts"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_latency = LatencyHistogram()
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.checkout_latency.observe((time.perf_counter() - start) * 1000)
+
+    def recreate(self):
+        # Keep the figures when the engine is disposed and the pool rebuilt
+        pool = super().recreate()
+        pool.checkout_latency = self.checkout_latency
+        pool.timeouts = self.timeouts
+        return pool
+
+    def stats(self) -> dict:
+        """Returns the pool occupancy and checkout latency"""
+        size = self.size()
+        in_use = self.checkedout()
+        capacity = size + self._max_overflow if self._max_overflow >= 0 else None
+        return {
+            "pool": type(self).__name__,
+            "size": size,
+            "max_overflow": self._max_overflow,
+            "in_use": in_use,
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "saturation": round(in_use / capacity, 3) if capacity else None,
+            "timeouts": self.timeouts,
+            "checkout_ms": self.checkout_latency.snapshot(),
+        }
+
+
+def pool_stats(pool) -> dict:
+    """Returns the figures of any pool, in full for a TimedQueuePool"""
+    if isinstance(pool, TimedQueuePool):
+        return pool.stats()
+    return {"pool": type(pool).__name__, "status": pool.status()}
+
+
+def engine_options(config, uri: str) -> dict:
+    """Returns the engine options for uri built from the DB_* settings
+
+    Options already present in SQLALCHEMY_ENGINE_OPTIONS win. SQLite keeps
+    the pool SQLAlchemy picks for it: an in-memory database cannot be
+    shared by a pool of connections.
+    """
+    options = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    options.setdefault("pool_pre_ping", config.get("DB_POOL_PRE_PING", False))
+    options.setdefault("pool_recycle", config.get("DB_POOL_RECYCLE", 1800))
+    if not uri.startswith("sqlite"):
+        options.setdefault("poolclass", TimedQueuePool)
+        options.setdefault("pool_size", config.get("DB_POOL_SIZE", 5))
+        options.setdefault("max_overflow", config.get("DB_MAX_OVERFLOW", 10))
+        options.setdefault("pool_timeout", config.get("DB_POOL_TIMEOUT", 30))
+    timeout = config.get("DB_STATEMENT_TIMEOUT")
+    if timeout and uri.startswith("postgresql"):
+        connect_args = dict(options.get("connect_args") or {})
+        connect_args.setdefault("options", f"-c statement_timeout={int(timeout)}")
+        options["connect_args"] = connect_args
+    return options
+
+
+def configure_pool(app):
+    """Fills SQLALCHEMY_ENGINE_OPTIONS from the DB_* settings
+
+    Must run before db.init_app(), which creates the engine.
+    """
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI") or ""
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config, uri)
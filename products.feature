@@ -27,17 +27,21 @@ Scenario: Create a Product
     Then I should see the message "Success"
     When I copy the "Id" field
     And I press the "Clear" button
-    Then the "Id" field should be empty
-    And the "Name" field should be empty
-    And the "Description" field should be empty
+    Then the following fields should be empty
+        | field       |
+        | Id          |
+        | Name        |
+        | Description |
     When I paste the "Id" field
     And I press the "Retrieve" button
     Then I should see the message "Success"
-    And I should see "Hammer" in the "Name" field
-    And I should see "Claw hammer" in the "Description" field
-    And I should see "True" in the "Available" dropdown
-    And I should see "Tools" in the "Category" dropdown
-    And I should see "34.95" in the "Price" field
+    And I should see the following field values
+        | field       | value       |
+        | Name        | Hammer      |
+        | Description | Claw hammer |
+        | Available   | True        |
+        | Category    | Tools       |
+        | Price       | 34.95       |
 
 Scenario: Delete a Product
     When I visit the "Home Page"
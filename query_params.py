@@ -0,0 +1,85 @@
+"""
+Query parameter parsing
+
+The filters and sort order of the product listings, shared by the Flask
+routes and the async read path so that both read a query string the same
+way. A repeated parameter takes its first value, as Flask's
+request.args.get() does.
+"""
+from decimal import Decimal, InvalidOperation
+from urllib.parse import parse_qsl
+from service.models import ModProduct, ProductCategory
+
+SORT_COLUMNS = {
+    "id": ModProduct.id,
+    "title": ModProduct.title,
+    "cost": ModProduct.cost,
+}
+
+
+class QueryParameterError(Exception):
+    """Used for invalid query parameters"""
+
+
+def parse_query_string(query_string: str) -> dict:
+    """Returns the parameters of a query string, keeping the first of each"""
+    args = {}
+    for name, value in parse_qsl(query_string, keep_blank_values=True):
+        args.setdefault(name, value)
+    return args
+
+
+def parse_category(value):
+    """Converts a category name to a ProductCategory"""
+    if value is None:
+        return None
+    product_category = getattr(ProductCategory, value.upper(), None)
+    if not isinstance(product_category, ProductCategory):
+        raise QueryParameterError(f"Invalid category: {value}")
+    return product_category
+
+
+def parse_bool(name, value):
+    """Converts a true/false query parameter"""
+    if value is None:
+        return None
+    if value.lower() in ("true", "1", "yes"):
+        return True
+    if value.lower() in ("false", "0", "no"):
+        return False
+    raise QueryParameterError(f"Invalid {name}: {value}")
+
+
+def parse_decimal(name, value):
+    """Converts a decimal query parameter"""
+    if value is None:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation as error:
+        raise QueryParameterError(f"Invalid {name}: {value}") from error
+
+
+def parse_sort(value):
+    """Returns the sort column and direction named by the sort parameter"""
+    if not value:
+        return None, False
+    sort_column = SORT_COLUMNS.get(value.lstrip("-"))
+    if sort_column is None:
+        raise QueryParameterError(f"Invalid sort: {value}")
+    return sort_column, value.startswith("-")
+
+
+def product_filters(args) -> dict:
+    """Returns the name, category, available, min_cost and max_cost filters
+
+    args is any mapping of parameter names to their first value, such as
+    Flask's request.args or the result of parse_query_string().
+    """
+    return {
+        "name": args.get("name"),
+        "category": parse_category(args.get("category")),
+        "available": parse_bool("available", args.get("available")),
+        "min_cost": parse_decimal("min_cost", args.get("min_cost")),
+        "max_cost": parse_decimal("max_cost", args.get("max_cost")),
+    }
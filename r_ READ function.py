@@ -1,6 +1,8 @@
-from flask import jsonify, request, abort
+from flask import jsonify, request, abort, make_response
 from flask import url_for  # noqa: F401 pylint: disable=unused-import
-from service.models import Product
+from service.cache import product_cache
+from service.instrumentation import timed
+from service.repository import product_repository
 from service.common import status  # HTTP Status Codes
 from . import app
 
@@ -11,11 +13,27 @@ def get_product(product_id):
     """
     Retrieves a specific product by ID
     This endpoint will return the details of a product based on its ID.
+    A request whose If-None-Match holds the current ETag gets a 304.
     """
 
-    product = Product.query.get(product_id)
+    with timed("query"):
+        product = product_cache.get(product_id, product_repository.find)
     if product is None:
         abort(status.HTTP_404_NOT_FOUND)
-    return jsonify(product.serialize())
+    if request.if_none_match.contains(product.etag):
+        response = make_response("", status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = jsonify(product.data)
+    response.set_etag(product.etag)
+    return response
+
+@app.route("/products/cache/stats", methods=["GET"])
+def get_product_cache_stats():
+    """
+    Returns the product cache counters
+    This endpoint will return the size, hits, misses and evictions of the cache.
+    """
+
+    return jsonify(product_cache.stats())
 
 # ... (remaining code)
@@ -0,0 +1,68 @@
+import json
+from flask import jsonify, request, abort
+from service.repository import product_repository
+from service.common import status  # HTTP Status Codes
+from service.idempotency import REPLAYED_HEADER, idempotency_key, key_sweeper
+from . import app
+
+# ... (previous code)
+
+######################################################################
+# CREATE PRODUCTS IN BULK
+######################################################################
+@app.route("/products/batch", methods=["POST"])
+def create_products_batch():
+    """
+    Creates Products in bulk
+    This endpoint accepts a JSON array, or an NDJSON stream with one product
+    per line, and returns the new id or the validation error for every item.
+    With an Idempotency-Key header a retried batch creates nothing twice;
+    items created by an earlier attempt are returned with ``replayed`` set.
+    """
+    app.logger.info("Request to Create a batch of Products...")
+    key = idempotency_key(request)
+    if request.mimetype == "application/x-ndjson":
+        items = _ndjson_items(request.stream)
+    else:
+        check_content_type("application/json")
+        items = request.get_json()
+        if not isinstance(items, list):
+            abort(status.HTTP_400_BAD_REQUEST, "Request body must be a JSON array")
+
+    chunk_size = app.config.get("BATCH_CHUNK_SIZE", 500)
+    headers = {}
+    if key is None:
+        results = product_repository.create_all(items, chunk_size=chunk_size)
+    else:
+        key_sweeper.maybe_sweep(app.config.get("IDEMPOTENCY_SWEEP_INTERVAL", 300.0))
+        results = product_repository.create_all(
+            items,
+            chunk_size=chunk_size,
+            idempotency_key=key,
+            ttl=app.config.get("IDEMPOTENCY_KEY_TTL", 86400.0),
+        )
+        if any(result.get("replayed") for result in results):
+            headers[REPLAYED_HEADER] = "true"
+    app.logger.info("Bulk create processed %s products", len(results))
+
+    if any("error" in result for result in results):
+        return jsonify(results), status.HTTP_207_MULTI_STATUS, headers
+    return jsonify(results), status.HTTP_201_CREATED, headers
+
+
+def _ndjson_items(stream):
+    """Yields one decoded item per non-blank NDJSON line
+
+    Lines that are not valid JSON are yielded as None so that they are
+    reported as per-item validation errors instead of failing the batch.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+# ... (remaining code)
@@ -0,0 +1,42 @@
+from flask import jsonify, request, url_for
+from service.models import ModProduct
+from service.repository import product_repository
+from service.common import status  # HTTP Status Codes
+from service.idempotency import REPLAYED_HEADER, idempotency_key, key_sweeper
+from . import app
+
+# ... (previous code)
+
+######################################################################
+# CREATE A NEW PRODUCT
+######################################################################
+@app.route("/products", methods=["POST"])
+def create_products():
+    """
+    Creates a Product
+    This endpoint will create a Product based on the data in the body that is posted.
+    With an Idempotency-Key header a retried request returns the product the
+    first request created, in its current state and marked with
+    Idempotent-Replayed, instead of a copy. Deleting that product releases
+    the key.
+    """
+    check_content_type("application/json")
+    key = idempotency_key(request)
+    product = ModProduct().deserialize(request.get_json())
+
+    headers = {}
+    if key is None:
+        product_repository.create(product)
+    else:
+        key_sweeper.maybe_sweep(app.config.get("IDEMPOTENCY_SWEEP_INTERVAL", 300.0))
+        product, created = product_repository.create_once(
+            product, key, ttl=app.config.get("IDEMPOTENCY_KEY_TTL", 86400.0)
+        )
+        if not created:
+            headers[REPLAYED_HEADER] = "true"
+    app.logger.debug("Product with new id [%s] saved!", product.id)
+
+    headers["Location"] = url_for("get_product", product_id=product.id, _external=True)
+    return jsonify(product.serialize()), status.HTTP_201_CREATED, headers
+
+# ... (remaining code)
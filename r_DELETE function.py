@@ -1,5 +1,6 @@
-from flask import jsonify, abort
-from service.models import Product
+from flask import jsonify, request, abort
+from service.query_params import parse_bool, product_filters
+from service.repository import product_repository
 from service.common import status
 from . import app
 
@@ -12,12 +13,57 @@ def delete_product(product_id):
     This endpoint will delete a product based on its ID.
     """
 
-    product = Product.query.get(product_id)
+    product = product_repository.find(product_id)
     if product is None:
         abort(status.HTTP_404_NOT_FOUND)
 
-    product.delete()
+    product_repository.delete(product)
 
     return jsonify(status="Product deleted")
 
+@app.route("/products", methods=["DELETE"])
+def delete_products():
+    """
+    Deletes every product matching a filter
+    This endpoint takes the same ``name``, ``category``, ``available``,
+    ``min_cost`` and ``max_cost`` filters as the list endpoint and removes
+    the matches with one statement. ``all=true`` empties the catalog.
+    """
+
+    filters = product_filters(request.args)
+    if any(value is not None for value in filters.values()):
+        count = product_repository.delete_all(**filters)
+    elif parse_bool("all", request.args.get("all")):
+        count = product_repository.delete_all()
+    else:
+        abort(
+            status.HTTP_400_BAD_REQUEST,
+            "Refusing to delete every product without all=true",
+        )
+
+    app.logger.info("Deleted %s products", count)
+    return jsonify(deleted=count)
+
+@app.route("/products/batch", methods=["DELETE"])
+def delete_products_batch():
+    """
+    Deletes products by ID in bulk
+    This endpoint takes a JSON array of product ids and removes them in one
+    transaction. Ids that do not exist are counted as not found.
+    """
+
+    check_content_type("application/json")
+    ids = request.get_json()
+    if not isinstance(ids, list) or not all(
+        isinstance(product_id, int) and not isinstance(product_id, bool)
+        for product_id in ids
+    ):
+        abort(status.HTTP_400_BAD_REQUEST, "Request body must be a JSON array of ids")
+
+    chunk_size = app.config.get("BATCH_CHUNK_SIZE", 500)
+    count = product_repository.delete_ids(ids, chunk_size=chunk_size)
+
+    app.logger.info("Deleted %s products", count)
+    return jsonify(deleted=count, not_found=len(set(ids)) - count)
+
 # ... (remaining code)
@@ -0,0 +1,40 @@
+from flask import jsonify
+from service.common import status  # HTTP Status Codes
+from service.models import UnsupportedOperation
+from service.query_params import QueryParameterError
+from . import app
+
+# ... (previous code)
+
+######################################################################
+# ERROR HANDLERS
+######################################################################
+@app.errorhandler(UnsupportedOperation)
+def unsupported_operation(error):
+    """Handles requests the configured product repository cannot serve"""
+    message = str(error)
+    app.logger.warning(message)
+    return (
+        jsonify(
+            status=status.HTTP_501_NOT_IMPLEMENTED,
+            error="Not Implemented",
+            message=message,
+        ),
+        status.HTTP_501_NOT_IMPLEMENTED,
+    )
+
+@app.errorhandler(QueryParameterError)
+def bad_query_parameter(error):
+    """Handles query parameters that are not valid"""
+    message = str(error)
+    app.logger.warning(message)
+    return (
+        jsonify(
+            status=status.HTTP_400_BAD_REQUEST,
+            error="Bad Request",
+            message=message,
+        ),
+        status.HTTP_400_BAD_REQUEST,
+    )
+
+# ... (remaining code)
@@ -0,0 +1,27 @@
+from flask import jsonify
+from service.facets import PRICE_BUCKETS, facet_cache
+from service.repository import product_repository
+from . import app
+
+# ... (previous code)
+
+######################################################################
+# PRODUCT FACETS
+######################################################################
+@app.route("/products/facets", methods=["GET"])
+def get_product_facets():
+    """
+    Returns the product counts for the storefront sidebar
+    This endpoint will return the number of products and of available
+    products per category and the number of products per price bucket.
+    The counts are cached until the next write to the catalog.
+    """
+
+    buckets = app.config.get("FACET_PRICE_BUCKETS", PRICE_BUCKETS)
+    facets = facet_cache.get(
+        lambda: product_repository.facets(buckets),
+        ttl=app.config.get("FACETS_CACHE_TTL", 5.0),
+    )
+    return jsonify(facets)
+
+# ... (remaining code)
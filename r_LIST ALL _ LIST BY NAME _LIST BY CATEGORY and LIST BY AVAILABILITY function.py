@@ -1,46 +1,146 @@
-from flask import jsonify, request, abort
-from . import app
-from service.models import Product
-from service.common import status
-
-# ... (previous code)
-
-@app.route("/products", methods=["GET"])
-def get_products():
-    """
-    Lists all products
-    This endpoint will return a list of all products.
-    """
-
-    products = Product.query.all()
-    return jsonify([product.serialize() for product in products])
-
-@app.route("/products/name/<string:name>", methods=["GET"])
-def get_products_by_name(name):
-    """
-    Lists all products by name
-    This endpoint will return a list of all products that match the given name.
-    """
-
-    products = Product.query.filter_by(name=name).all()
-    return jsonify([product.serialize() for product in products])
-
-@app.route("/products/category/<string:category>", methods=["GET"])
-def get_products_by_category(category):
-    """
-    Lists all products by category
-    This endpoint will return a list of all products that match the given category.
-    """
-
-    products = Product.query.filter_by(category=category).all()
-    return jsonify([product.serialize() for product in products])
-
-@app.route("/products/availability/<bool:availability>", methods=["GET"])
-def get_products_by_availability(availability):
-    """
-    Lists all products by availability
-    This endpoint will return a list of all products that match the given availability.
-    """
-
-    products = Product.query.filter_by(available=availability).all()
-    return jsonify([product.serialize() for product in products])
+from flask import jsonify, request, abort, url_for
+from . import app
+from service.models import ModProduct
+from service.common import status
+from service.encoders import encode_list, project, row_encoder, use_row_encoder
+from service.instrumentation import timed
+from service.pagination import PaginationError, paginate, paginate_items, parse_limit
+from service.query_params import parse_category, parse_sort, product_filters
+from service.repository import product_repository
+from service.result_cache import result_cache
+from service.streaming import stream_mode, stream_response
+
+# ... (previous code)
+
+@app.route("/products", methods=["GET"])
+def get_products():
+    """
+    Lists all products
+    This endpoint will return a page of all products. The optional ``name``,
+    ``category``, ``available``, ``min_cost`` and ``max_cost`` query
+    parameters are combined into one query, ordered by ``sort`` (``id``,
+    ``title`` or ``cost``, prefixed with ``-`` for descending).
+    """
+
+    query = product_repository.listing(**product_filters(request.args))
+    sort_column, descending = parse_sort(request.args.get("sort"))
+    return _list_response(query, sort_column, descending)
+
+@app.route("/products/name/<string:name>", methods=["GET"])
+def get_products_by_name(name):
+    """
+    Lists all products by name
+    This endpoint will return a page of products that match the given name.
+    """
+
+    return _list_response(product_repository.listing(name=name))
+
+@app.route("/products/category/<string:category>", methods=["GET"])
+def get_products_by_category(category):
+    """
+    Lists all products by category
+    This endpoint will return a page of products that match the given category.
+    Pages are served from the result cache.
+    """
+
+    product_category = parse_category(category)
+    return _cached_list_response(
+        "category", product_category.name, lambda: product_repository.listing(category=product_category)
+    )
+
+@app.route("/products/availability/<bool:availability>", methods=["GET"])
+def get_products_by_availability(availability):
+    """
+    Lists all products by availability
+    This endpoint will return a page of products that match the given availability.
+    Pages are served from the result cache.
+    """
+
+    return _cached_list_response(
+        "availability", availability, lambda: product_repository.listing(available=availability)
+    )
+
+
+# Headers of a listing page that are cached along with its body
+CACHED_HEADERS = ("X-Next-Cursor", "Link")
+
+
+def _cached_list_response(kind, value, make_query):
+    """
+    Returns one page of a product query through the result cache
+    The page is cached as encoded bytes under the query kind and value, the
+    host and the query parameters. Streaming requests bypass the cache.
+    """
+    if stream_mode(request) or not result_cache.entries.maxsize:
+        return _list_response(make_query())
+
+    def encode():
+        page = _list_response(make_query())
+        headers = {name: page.headers[name] for name in CACHED_HEADERS if name in page.headers}
+        return page.get_data(), headers
+
+    key = (kind, value, request.host_url, tuple(sorted(request.args.items(multi=True))))
+    entry = result_cache.get(key, encode)
+    response = app.response_class(entry.body, mimetype="application/json")
+    response.headers.update(entry.headers)
+    return response
+
+
+def _list_response(query, sort_column=None, descending=False):
+    """
+    Returns one page of a product query as a JSON list
+    The page size comes from the ``limit`` query parameter, capped at
+    PAGE_SIZE_MAX, and the ``cursor`` parameter continues a previous page.
+    The next page is advertised in the X-Next-Cursor and Link headers.
+    Streaming requests (NDJSON or ``stream=true``) get every row instead.
+    Rows are selected as plain columns and encoded without ORM instances
+    whenever the app's JSON settings allow it. A list of products from the
+    memory repository is paged in process with the same cursors.
+    """
+    in_memory = isinstance(query, list)
+    mode = stream_mode(request)
+    if mode:
+        if in_memory:
+            query, _ = paginate_items(
+                query, ModProduct, len(query), sort_column=sort_column, descending=descending
+            )
+        elif sort_column is not None:
+            query = query.order_by(sort_column.desc() if descending else sort_column)
+        return stream_response(query, mode)
+
+    fast_path = use_row_encoder(app) and not in_memory
+    if fast_path:
+        query = project(query)
+    try:
+        limit = parse_limit(
+            request.args.get("limit"),
+            default=app.config.get("PAGE_SIZE_DEFAULT", 100),
+            maximum=app.config.get("PAGE_SIZE_MAX", 1000),
+        )
+        with timed("query"):
+            products, next_cursor = (paginate_items if in_memory else paginate)(
+                query,
+                ModProduct,
+                limit,
+                request.args.get("cursor"),
+                sort_column=sort_column,
+                descending=descending,
+            )
+    except PaginationError as error:
+        abort(status.HTTP_400_BAD_REQUEST, str(error))
+
+    if fast_path:
+        with timed("serialize"):
+            body = encode_list(products, row_encoder(app))
+        response = app.response_class(body, mimetype="application/json")
+    else:
+        with timed("serialize"):
+            data = [product.serialize() for product in products]
+        response = jsonify(data)
+    if next_cursor:
+        args = {**request.view_args, **request.args.to_dict()}
+        args.update(limit=limit, cursor=next_cursor)
+        next_url = url_for(request.endpoint, _external=True, **args)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
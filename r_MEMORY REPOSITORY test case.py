@@ -0,0 +1,96 @@
+import logging
+import unittest
+from service import app
+from service.common import status
+from service.models import initialize_db
+from service.repository import MemoryRepository, product_repository
+from service.result_cache import result_cache
+from tests.factories import ModProductFactory
+
+BASE_URL = "/products"
+
+
+class TestMemoryRepositoryRoutes(unittest.TestCase):
+    """Product Service tests against the memory repository"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Run once before all tests"""
+        app.config["TESTING"] = True
+        app.config["DEBUG"] = False
+        app.config["PRODUCT_REPOSITORY"] = "memory"
+        app.logger.setLevel(logging.CRITICAL)
+        initialize_db(app)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Run once after all tests"""
+        app.config.pop("PRODUCT_REPOSITORY")
+
+    def setUp(self):
+        """Runs before each test"""
+        self.client = app.test_client()
+        product_repository.delete_all()
+        result_cache.clear()
+
+    def _create_products(self, count: int) -> list:
+        products = []
+        for _ in range(count):
+            product = ModProductFactory(id=None)
+            product_repository.create(product)
+            products.append(product)
+        return products
+
+    def test_initialize_db_picks_memory(self):
+        """It should set up the backend named by PRODUCT_REPOSITORY"""
+        self.assertIsInstance(product_repository.backend, MemoryRepository)
+
+    def test_list_pages(self):
+        """It should page the catalog with the same cursors as the database"""
+        products = self._create_products(5)
+        response = self.client.get(BASE_URL, query_string={"limit": 2, "sort": "-cost"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        seen = [product["id"] for product in response.get_json()]
+        while "X-Next-Cursor" in response.headers:
+            response = self.client.get(BASE_URL, query_string={
+                "limit": 2, "sort": "-cost", "cursor": response.headers["X-Next-Cursor"],
+            })
+            seen += [product["id"] for product in response.get_json()]
+        expected = sorted(products, key=lambda p: (p.cost, p.id), reverse=True)
+        self.assertEqual(seen, [p.id for p in expected])
+
+    def test_list_by_category_and_stream(self):
+        """It should serve the category listing and the NDJSON export"""
+        products = self._create_products(3)
+        category = products[0].category.name
+        response = self.client.get(f"{BASE_URL}/category/{category}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(products[0].id, [product["id"] for product in response.get_json()])
+        response = self.client.get(BASE_URL, headers={"Accept": "application/x-ndjson"})
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), 3)
+
+    def test_facets_search_and_batches(self):
+        """It should serve facets, search and the batch routes"""
+        products = self._create_products(2)
+        response = self.client.get(f"{BASE_URL}/facets")
+        self.assertEqual(response.get_json()["total"], 2)
+        response = self.client.get(f"{BASE_URL}/search", query_string={"q": products[0].title})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(
+            f"{BASE_URL}/batch", json=[{"id": products[0].id, "title": "Renamed"}]
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.delete(f"{BASE_URL}/batch", json=[p.id for p in products])
+        self.assertEqual(response.get_json()["deleted"], 2)
+
+    def test_unsupported_routes(self):
+        """It should answer 501 for what needs the database"""
+        data = ModProductFactory().serialize()
+        response = self.client.post(BASE_URL, json=data, headers={"Idempotency-Key": "k"})
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        response = self.client.put(f"{BASE_URL}/sync", json=[])
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+
+if __name__ == "__main__":
+    unittest.main()
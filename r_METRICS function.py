@@ -0,0 +1,26 @@
+from service.instrumentation import request_metrics
+from service.log_pipeline import dropped_records
+from . import app
+
+# ... (previous code)
+
+######################################################################
+# REQUEST METRICS
+######################################################################
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Returns the request metrics in the Prometheus text format
+    This endpoint will return a latency histogram per endpoint and request
+    phase (sql, orm, serialize, encode and total), the number of SQL
+    statements each endpoint has run and the log records dropped.
+    """
+
+    body = request_metrics.render() + (
+        "# HELP log_records_dropped_total Log records dropped on a full queue\n"
+        "# TYPE log_records_dropped_total counter\n"
+        f"log_records_dropped_total {dropped_records(app)}\n"
+    )
+    return app.response_class(body, mimetype="text/plain; version=0.0.4")
+
+# ... (remaining code)
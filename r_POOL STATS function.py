@@ -0,0 +1,20 @@
+from flask import jsonify
+from service.repository import product_repository
+from . import app
+
+# ... (previous code)
+
+######################################################################
+# DATABASE CONNECTION POOL METRICS
+######################################################################
+@app.route("/pool/stats", methods=["GET"])
+def get_pool_stats():
+    """
+    Returns the database connection pool figures
+    This endpoint will return the connections in use and idle, the pool
+    saturation, checkout timeouts and a histogram of checkout latency.
+    """
+
+    return jsonify(product_repository.pool_stats())
+
+# ... (remaining code)
@@ -0,0 +1,34 @@
+from flask import jsonify, request, abort
+from service.repository import product_repository
+from service.common import status  # HTTP Status Codes
+from service.pagination import PaginationError, parse_limit
+from . import app
+
+# ... (previous code)
+
+######################################################################
+# FULL-TEXT SEARCH FOR PRODUCTS
+######################################################################
+@app.route("/products/search", methods=["GET"])
+def search_products():
+    """
+    Searches products by the words in their title and details
+    This endpoint will return up to ``limit`` products matching the ``q``
+    query parameter, best match first.
+    """
+    text_query = request.args.get("q", "").strip()
+    if not text_query:
+        abort(status.HTTP_400_BAD_REQUEST, "Missing search query parameter: q")
+    try:
+        limit = parse_limit(
+            request.args.get("limit"),
+            default=app.config.get("SEARCH_RESULTS_DEFAULT", 20),
+            maximum=app.config.get("PAGE_SIZE_MAX", 1000),
+        )
+    except PaginationError as error:
+        abort(status.HTTP_400_BAD_REQUEST, str(error))
+
+    products = product_repository.search_text(text_query, limit)
+    return jsonify([product.serialize() for product in products])
+
+# ... (remaining code)
@@ -0,0 +1,43 @@
+from flask import jsonify, request, abort
+from service.query_params import parse_bool
+from service.repository import product_repository
+from service.common import status  # HTTP Status Codes
+from . import app
+
+# ... (previous code)
+
+######################################################################
+# SYNC THE CATALOG WITH A SUPPLIER FEED
+######################################################################
+@app.route("/products/sync", methods=["PUT"])
+def sync_products():
+    """
+    Brings the catalog in step with a full supplier feed
+    This endpoint accepts a JSON array, or an NDJSON stream with one item
+    per line, of products keyed by ``sku``. Only items that differ from the
+    stored products are written; products whose sku is missing from the
+    feed are deleted unless ``prune=false`` is given.
+    """
+    app.logger.info("Request to Sync the catalog...")
+    prune = parse_bool("prune", request.args.get("prune", "true"))
+    if request.mimetype == "application/x-ndjson":
+        items = _ndjson_items(request.stream)
+    else:
+        check_content_type("application/json")
+        items = request.get_json()
+        if not isinstance(items, list):
+            abort(status.HTTP_400_BAD_REQUEST, "Request body must be a JSON array")
+
+    summary = product_repository.sync(
+        items, chunk_size=app.config.get("BATCH_CHUNK_SIZE", 500), prune=prune
+    )
+    app.logger.info(
+        "Catalog sync inserted %s, updated %s and deleted %s products",
+        summary["inserted"], summary["updated"], summary["deleted"],
+    )
+
+    if summary["errors"]:
+        return jsonify(summary), status.HTTP_207_MULTI_STATUS
+    return jsonify(summary), status.HTTP_200_OK
+
+# ... (remaining code)
@@ -0,0 +1,33 @@
+from flask import jsonify, request, abort
+from service.repository import product_repository
+from service.common import status  # HTTP Status Codes
+from . import app
+
+# ... (previous code)
+
+######################################################################
+# UPDATE PRODUCTS IN BULK
+######################################################################
+@app.route("/products/batch", methods=["PATCH"])
+def update_products_batch():
+    """
+    Partially updates Products in bulk
+    This endpoint accepts a JSON array of patches such as
+    ``{"id": 7, "version": 3, "cost": "9.99"}`` and applies them with
+    set-based UPDATEs. A patch with a stale ``version`` gets a 409 result.
+    """
+    app.logger.info("Request to Update a batch of Products...")
+    check_content_type("application/json")
+    patches = request.get_json()
+    if not isinstance(patches, list):
+        abort(status.HTTP_400_BAD_REQUEST, "Request body must be a JSON array")
+
+    chunk_size = app.config.get("BATCH_CHUNK_SIZE", 500)
+    results = product_repository.update_all(patches, chunk_size=chunk_size)
+    app.logger.info("Bulk update processed %s patches", len(results))
+
+    if any(result["status"] != status.HTTP_200_OK for result in results):
+        return jsonify(results), status.HTTP_207_MULTI_STATUS
+    return jsonify(results), status.HTTP_200_OK
+
+# ... (remaining code)
@@ -1,5 +1,6 @@
 from flask import jsonify, request, abort
-from service.models import Product
+from sqlalchemy.orm.exc import StaleDataError
+from service.repository import product_repository
 from service.common import status
 from . import app
 
@@ -10,17 +11,24 @@ def update_product(product_id):
     """
     Updates a specific product by ID
     This endpoint will update the details of a product based on its ID.
+    A request that races another update of the same product gets a 409.
     """
 
     check_content_type("application/json")
     data = request.get_json()
 
-    product = Product.query.get(product_id)
+    product = product_repository.find(product_id)
     if product is None:
         abort(status.HTTP_404_NOT_FOUND)
 
     product.deserialize(data)
-    product.update()
+    try:
+        product_repository.update(product)
+    except StaleDataError:
+        abort(
+            status.HTTP_409_CONFLICT,
+            f"Product with id '{product_id}' was changed by another request, retry",
+        )
 
     return jsonify(product.serialize())
 
@@ -0,0 +1,181 @@
+"""
+Read replicas
+
+RoutingSession sends read-only SELECTs to the replica engines listed in
+SQLALCHEMY_REPLICA_URIS and everything else to the primary. A SELECT is
+read-only when it runs inside a GET or HEAD request, or inside a
+ModProduct read classmethod marked with @read_only, or in a
+reading_from_replica() block.
+
+Replicas are picked round-robin. Each one is health checked with a
+``SELECT 1`` at most every REPLICA_CHECK_INTERVAL seconds, and an
+unhealthy replica is skipped until it passes a check again. When no
+replica is healthy, reads fall back to the primary.
+
+Once a session has written it reads from the primary until it is
+removed at the end of the request, so a request always sees its own
+writes. For REPLICA_LAG_WINDOW seconds (default 1) after any write made
+by this process, reads go to the primary as well; otherwise the GET that
+follows a write would refill the product and result caches from a
+replica that has not caught up yet. Set it above the replicas' usual
+lag.
+
+Locking reads (FOR UPDATE) always go to the primary, and so does
+ModProduct.find() outside GET requests, because it loads the products
+that PUT and DELETE are about to change.
+"""
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, exc, text
+from service.catalog import catalog_version
+from service.pool import engine_options
+
+logger = logging.getLogger("flask.app")
+
+_read_only = ContextVar("read_only", default=False)
+
+
+@contextmanager
+def reading_from_replica():
+    """Lets the SELECTs run in this block go to a replica"""
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def read_only(function):
+    """Marks a function whose queries may be answered by a replica"""
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with reading_from_replica():
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaSet:
+    """Round-robin over the replica engines that pass their health check"""
+
+    def __init__(self, engines: list = (), check_interval: float = 5.0,
+                 lag_window: float = 1.0, clock=time.monotonic):
+        self.engines = list(engines)
+        self.check_interval = check_interval
+        self.lag_window = lag_window
+        self._clock = clock
+        self._health = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def pick(self):
+        """Returns the next healthy replica engine, or None"""
+        for _ in range(len(self.engines)):
+            with self._lock:
+                if not self.engines:
+                    return None
+                engine = self.engines[self._next % len(self.engines)]
+                self._next += 1
+            if self.healthy(engine):
+                return engine
+        return None
+
+    def healthy(self, engine) -> bool:
+        """Returns the last health of engine, checking it when due"""
+        now = self._clock()
+        checked_at, healthy = self._health.get(engine, (None, True))
+        if checked_at is None or now - checked_at >= self.check_interval:
+            healthy = self._check(engine)
+            self._health[engine] = (now, healthy)
+        return healthy
+
+    @staticmethod
+    def _check(engine) -> bool:
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            return True
+        except exc.SQLAlchemyError as error:
+            logger.warning("Replica %s failed its health check: %s", engine.url, error)
+            return False
+
+    def stats(self) -> list:
+        """Returns the health of every replica"""
+        return [
+            {"url": engine.url.render_as_string(hide_password=True),
+             "healthy": self._health.get(engine, (None, True))[1]}
+            for engine in self.engines
+        ]
+
+
+# The replicas used by RoutingSession, filled later by configure_replicas()
+replica_set = ReplicaSet()
+
+
+class RoutingSession(Session):
+    """A session that reads from a replica whenever it safely can"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            engine = replica_set.pick()
+            if engine is not None:
+                return engine
+        if bind is None and self.bind is not None:
+            # A session bound to one connection, as the test harness binds it
+            return self.bind
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause) -> bool:
+        if not _read_only.get() or self.info.get("wrote") or self._flushing:
+            return False
+        if catalog_version.changed_within(replica_set.lag_window):
+            return False
+        if clause is None or not getattr(clause, "is_select", False):
+            return False
+        return getattr(clause, "_for_update_arg", None) is None
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _wrote_on_flush(session, flush_context):  # pylint: disable=unused-argument
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _wrote_on_commit(session):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _wrote_on_execute(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
+
+def _start_request():
+    if request.method in ("GET", "HEAD"):
+        g.read_only_token = _read_only.set(True)
+
+
+def _end_request(error=None):  # pylint: disable=unused-argument
+    token = g.pop("read_only_token", None)
+    if token is not None:
+        _read_only.reset(token)
+
+
+def configure_replicas(app):
+    """Creates the replica engines and routes GET requests to them"""
+    uris = app.config.get("SQLALCHEMY_REPLICA_URIS") or []
+    replica_set.engines = [create_engine(uri, **engine_options(app.config, uri)) for uri in uris]
+    replica_set.check_interval = app.config.get("REPLICA_CHECK_INTERVAL", 5.0)
+    replica_set.lag_window = app.config.get("REPLICA_LAG_WINDOW", 1.0)
+    if uris:
+        logger.info("Reading from %s replica(s)", len(uris))
+        app.before_request(_start_request)
+        app.teardown_request(_end_request)
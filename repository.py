@@ -0,0 +1,471 @@
+"""
+Product repository
+
+One interface over the ways ModProducts can be stored. SqlRepository is
+the relational database behind ModProduct. MemoryRepository keeps the
+catalog in process: a dict by id plus secondary indexes on title,
+category and availability, so every find_by_* is a set lookup. It needs
+no database, which makes the model tests run in milliseconds. Its
+catalog is private to the process and lost on restart.
+
+The backend is picked by the ``PRODUCT_REPOSITORY`` setting, "sql" (the
+default) or "memory", when initialize_db() calls initialize_repository().
+Every route goes through product_repository. Operations the memory
+backend cannot serve, catalog sync and Idempotency-Key creates, raise
+UnsupportedOperation.
+"""
+import logging
+import threading
+from decimal import Decimal
+from collections import defaultdict
+from sqlalchemy.orm.exc import StaleDataError
+from service.cache import product_cache
+from service.catalog import catalog_version
+from service.facets import compute_facets, count_facets
+from service.fulltext import InvertedIndex, search_index
+from service.models import (
+    DataValidationError,
+    ModProduct,
+    ProductCategory,
+    UnsupportedOperation,
+    configure_services,
+    db,
+)
+from service.pool import pool_stats
+
+logger = logging.getLogger("flask.app")
+
+FIELDS = ("id", "title", "details", "cost", "available", "category", "version")
+REQUIRED_FIELDS = ("title", "details", "cost", "available", "category")
+
+
+class SqlRepository:
+    """Stores products in the relational database through ModProduct"""
+
+    def all(self) -> list:
+        """Returns every product"""
+        return ModProduct.all()
+
+    def find(self, product_id: int):
+        """Returns the product with the given id, or None"""
+        return ModProduct.find(product_id)
+
+    def find_by_name(self, name: str) -> list:
+        """Returns the products with the given name"""
+        return ModProduct.find_by_name(name).all()
+
+    def find_by_price(self, price: Decimal) -> list:
+        """Returns the products with the given price"""
+        return ModProduct.find_by_price(price).all()
+
+    def find_by_availability(self, available: bool = True) -> list:
+        """Returns the products by their availability"""
+        return ModProduct.find_by_availability(available).all()
+
+    def find_by_category(self, category: ProductCategory = ProductCategory.UNKNOWN) -> list:
+        """Returns the products in the given category"""
+        return ModProduct.find_by_category(category).all()
+
+    def search(self, **filters) -> list:
+        """Returns the products matching every filter of ModProduct.search()"""
+        return ModProduct.search(**filters).order_by(ModProduct.id).all()
+
+    def listing(self, **filters):
+        """Returns the query the list routes page, stream and encode"""
+        return ModProduct.search(**filters)
+
+    def search_text(self, text_query: str, limit: int = 20) -> list:
+        """Returns the products best matching a full-text query"""
+        return ModProduct.search_text(text_query, limit)
+
+    def facets(self, price_buckets: tuple) -> dict:
+        """Counts the catalog by category, availability and price bucket"""
+        return compute_facets(db.session, price_buckets)
+
+    def pool_stats(self) -> dict:
+        """Returns the database connection pool figures"""
+        return pool_stats(db.engine.pool)
+
+    def create(self, product: ModProduct):
+        """Stores a new product and assigns its id"""
+        product.create()
+
+    def update(self, product: ModProduct):
+        """Saves the changes made to a product"""
+        product.update()
+
+    def delete(self, product: ModProduct):
+        """Removes a product"""
+        product.delete()
+
+    def create_all(self, items, chunk_size: int = 500,
+                   idempotency_key: str = None, ttl: float = 86400.0) -> list:
+        """Creates products in bulk, see ModProduct.create_all()"""
+        return ModProduct.create_all(items, chunk_size, idempotency_key, ttl)
+
+    def create_once(self, product: ModProduct, key: str, ttl: float = 86400.0) -> tuple:
+        """Creates a product unless key was used before, see ModProduct.create_once()"""
+        return ModProduct.create_once(product, key, ttl)
+
+    def expire_idempotency_keys(self) -> int:
+        """Forgets the idempotency keys past their expiry"""
+        return ModProduct.expire_idempotency_keys()
+
+    def update_all(self, patches, chunk_size: int = 500) -> list:
+        """Applies partial updates in bulk, see ModProduct.update_all()"""
+        return ModProduct.update_all(patches, chunk_size)
+
+    def sync(self, items, chunk_size: int = 500, prune: bool = True) -> dict:
+        """Brings the products keyed by sku in step with a feed, see ModProduct.sync()"""
+        return ModProduct.sync(items, chunk_size, prune)
+
+    def delete_ids(self, ids: list, chunk_size: int = 1000) -> int:
+        """Removes the products with the given ids and returns how many there were"""
+        return ModProduct.delete_ids(ids, chunk_size)
+
+    def delete_all(self, **filters) -> int:
+        """Removes the products matching every filter, or all of them
+
+        Returns how many were removed.
+        """
+        if any(value is not None for value in filters.values()):
+            return ModProduct.delete_all(ModProduct.search(**filters))
+        return ModProduct.delete_all()
+
+
+class MemoryRepository:
+    """Stores products in process with secondary indexes
+
+    Rows are kept as plain dicts and handed out as fresh, detached
+    ModProducts, so a caller changing a product cannot leave the indexes
+    out of step; the change only lands through update().
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._by_title = defaultdict(set)
+        self._by_category = defaultdict(set)
+        self._by_available = defaultdict(set)
+        self._next_id = 1
+        self._lock = threading.RLock()
+
+    def _index(self, row: dict):
+        self._by_title[row["title"]].add(row["id"])
+        self._by_category[row["category"]].add(row["id"])
+        self._by_available[row["available"]].add(row["id"])
+
+    def _unindex(self, row: dict):
+        for index, key in (
+            (self._by_title, row["title"]),
+            (self._by_category, row["category"]),
+            (self._by_available, row["available"]),
+        ):
+            ids = index[key]
+            ids.discard(row["id"])
+            if not ids:
+                del index[key]
+
+    @staticmethod
+    def _row(product: ModProduct) -> dict:
+        missing = [name for name in REQUIRED_FIELDS if getattr(product, name) is None]
+        if missing:
+            raise DataValidationError("Invalid product: missing " + ", ".join(missing))
+        row = {name: getattr(product, name) for name in FIELDS}
+        row["cost"] = Decimal(row["cost"])
+        return row
+
+    def _products(self, ids) -> list:
+        return [ModProduct(**self._rows[product_id]) for product_id in sorted(ids)]
+
+    def all(self) -> list:
+        """Returns every product"""
+        with self._lock:
+            return self._products(self._rows)
+
+    def find(self, product_id: int):
+        """Returns the product with the given id, or None"""
+        with self._lock:
+            row = self._rows.get(product_id)
+            return ModProduct(**row) if row is not None else None
+
+    def find_by_name(self, name: str) -> list:
+        """Returns the products with the given name"""
+        with self._lock:
+            return self._products(self._by_title.get(name, ()))
+
+    def find_by_price(self, price: Decimal) -> list:
+        """Returns the products with the given price
+
+        Prices are not indexed, so this one scans the catalog.
+        """
+        if isinstance(price, str):
+            price = Decimal(price.strip(' "'))
+        with self._lock:
+            return self._products(
+                product_id for product_id, row in self._rows.items() if row["cost"] == price
+            )
+
+    def find_by_availability(self, available: bool = True) -> list:
+        """Returns the products by their availability"""
+        with self._lock:
+            return self._products(self._by_available.get(available, ()))
+
+    def find_by_category(self, category: ProductCategory = ProductCategory.UNKNOWN) -> list:
+        """Returns the products in the given category"""
+        with self._lock:
+            return self._products(self._by_category.get(category, ()))
+
+    def search(
+        self,
+        name: str = None,
+        category: ProductCategory = None,
+        available: bool = None,
+        min_cost: Decimal = None,
+        max_cost: Decimal = None,
+    ) -> list:
+        """Returns the products matching every given filter
+
+        The indexed filters are intersected smallest first; the cost range
+        is then checked on what is left.
+        """
+        with self._lock:
+            candidates = [
+                index.get(key, set())
+                for index, key in (
+                    (self._by_title, name),
+                    (self._by_category, category),
+                    (self._by_available, available),
+                )
+                if key is not None
+            ]
+            if candidates:
+                candidates.sort(key=len)
+                ids = set(candidates[0]).intersection(*candidates[1:])
+            else:
+                ids = self._rows.keys()
+            if min_cost is not None:
+                ids = [i for i in ids if self._rows[i]["cost"] >= min_cost]
+            if max_cost is not None:
+                ids = [i for i in ids if self._rows[i]["cost"] <= max_cost]
+            return self._products(ids)
+
+    def listing(self, **filters) -> list:
+        """Returns the products the list routes page, stream and encode"""
+        return self.search(**filters)
+
+    def search_text(self, text_query: str, limit: int = 20) -> list:
+        """Returns the products best matching a full-text query"""
+        ranked = search_index.search(text_query, limit)
+        with self._lock:
+            return [
+                ModProduct(**self._rows[product_id])
+                for product_id, _ in ranked
+                if product_id in self._rows
+            ]
+
+    def facets(self, price_buckets: tuple) -> dict:
+        """Counts the catalog by category, availability and price bucket"""
+        return count_facets(self.all(), price_buckets)
+
+    def pool_stats(self) -> dict:
+        """There is no connection pool to report on"""
+        raise UnsupportedOperation("The memory product repository has no connection pool")
+
+    def create(self, product: ModProduct):
+        """Stores a new product and assigns its id"""
+        logger.debug("Creating %s", product.title)
+        with self._lock:
+            product.id = self._next_id
+            product.version = 1
+            row = self._row(product)
+            self._next_id += 1
+            self._rows[row["id"]] = row
+            self._index(row)
+        catalog_version.bump()
+        search_index.add(product)
+
+    def update(self, product: ModProduct):
+        """Saves the changes made to a product
+
+        Like the database, it refuses a product read before the stored one
+        was last changed.
+        """
+        logger.debug("Saving %s", product.title)
+        if not product.id:
+            raise DataValidationError("Update called with empty ID field")
+        with self._lock:
+            current = self._rows.get(product.id)
+            if current is None:
+                raise DataValidationError(f"Product with id '{product.id}' was not found")
+            if product.version != current["version"]:
+                raise StaleDataError(f"Product with id '{product.id}' was changed meanwhile")
+            product.version = current["version"] + 1
+            row = self._row(product)
+            self._unindex(current)
+            self._rows[row["id"]] = row
+            self._index(row)
+        catalog_version.bump()
+        product_cache.invalidate(product.id)
+        search_index.add(product)
+
+    def delete(self, product: ModProduct):
+        """Removes a product"""
+        logger.debug("Deleting %s", product.title)
+        with self._lock:
+            row = self._rows.pop(product.id, None)
+            if row is not None:
+                self._unindex(row)
+        catalog_version.bump()
+        product_cache.invalidate(product.id)
+        search_index.remove(product.id)
+
+    def create_all(self, items, chunk_size: int = 500,
+                   idempotency_key: str = None, ttl: float = 86400.0) -> list:
+        """Creates products in bulk, see ModProduct.create_all()
+
+        Idempotency keys are not kept in memory.
+        """
+        if idempotency_key is not None:
+            raise UnsupportedOperation("Idempotency-Key needs the sql product repository")
+        results = []
+        for index, data in enumerate(items):
+            try:
+                product = ModProduct().deserialize(data)
+                self.create(product)
+            except DataValidationError as error:
+                results.append({"index": index, "error": str(error)})
+                continue
+            results.append({"index": index, "id": product.id})
+        return results
+
+    def create_once(self, product: ModProduct, key: str, ttl: float = 86400.0) -> tuple:
+        """Idempotency keys are not kept in memory"""
+        raise UnsupportedOperation("Idempotency-Key needs the sql product repository")
+
+    def expire_idempotency_keys(self) -> int:
+        """There are no idempotency keys to expire"""
+        return 0
+
+    def update_all(self, patches, chunk_size: int = 500) -> list:
+        """Applies partial updates in bulk, see ModProduct.update_all()"""
+        results = []
+        seen = set()
+        for index, data in enumerate(patches):
+            product_id = data.get("id") if isinstance(data, dict) else None
+            result = {"index": index, "id": product_id}
+            results.append(result)
+            try:
+                if not isinstance(product_id, int) or isinstance(product_id, bool):
+                    raise DataValidationError("Invalid patch: missing id")
+                if product_id in seen:
+                    raise DataValidationError("Invalid patch: duplicate id in batch")
+                version = data.get("version")
+                if version is not None and (
+                    not isinstance(version, int) or isinstance(version, bool)
+                ):
+                    raise DataValidationError("Invalid patch: version must be an integer")
+                values = ModProduct.validate_patch(
+                    {k: v for k, v in data.items() if k not in ("id", "version")}
+                )
+            except DataValidationError as error:
+                result.update(status=400, error=str(error))
+                continue
+            seen.add(product_id)
+            with self._lock:
+                current = self._rows.get(product_id)
+                expected = data.get("version")
+                if current is None:
+                    result.update(status=404, error="Product not found")
+                    continue
+                if expected is not None and expected != current["version"]:
+                    result.update(
+                        status=409, error=f"Version conflict: current is {current['version']}"
+                    )
+                    continue
+                row = dict(current, **values, version=current["version"] + 1)
+                self._unindex(current)
+                self._rows[product_id] = row
+                self._index(row)
+            result.update(status=200, version=row["version"])
+            catalog_version.bump()
+            product_cache.invalidate(product_id)
+            search_index.add(ModProduct(**row))
+        return results
+
+    def sync(self, items, chunk_size: int = 500, prune: bool = True) -> dict:
+        """Skus and content hashes are not kept in memory"""
+        raise UnsupportedOperation("Catalog sync needs the sql product repository")
+
+    def delete_ids(self, ids: list, chunk_size: int = 1000) -> int:
+        """Removes the products with the given ids and returns how many there were"""
+        removed = []
+        with self._lock:
+            for product_id in dict.fromkeys(ids):
+                row = self._rows.pop(product_id, None)
+                if row is not None:
+                    self._unindex(row)
+                    removed.append(product_id)
+        catalog_version.bump()
+        for product_id in removed:
+            product_cache.invalidate(product_id)
+            search_index.remove(product_id)
+        return len(removed)
+
+    def delete_all(self, **filters) -> int:
+        """Removes the products matching every filter, or all of them
+
+        Returns how many were removed.
+        """
+        if any(value is not None for value in filters.values()):
+            return self.delete_ids([product.id for product in self.search(**filters)])
+        with self._lock:
+            count = len(self._rows)
+            self._rows.clear()
+            self._by_title.clear()
+            self._by_category.clear()
+            self._by_available.clear()
+        catalog_version.bump()
+        product_cache.clear()
+        search_index.clear()
+        return count
+
+
+BACKENDS = {
+    "sql": SqlRepository,
+    "memory": MemoryRepository,
+}
+
+
+class ProductRepository:
+    """The repository used by the service, whichever backend it is
+
+    Every call is forwarded to the backend picked by
+    initialize_repository().
+    """
+
+    def __init__(self):
+        self.backend = SqlRepository()
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+product_repository = ProductRepository()
+
+
+def initialize_repository(app):
+    """Sets up the backend named by PRODUCT_REPOSITORY
+
+    The SQL backend initializes the database; the memory backend starts
+    with an empty catalog and search index and never connects to one.
+    """
+    name = app.config.get("PRODUCT_REPOSITORY", "sql")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown PRODUCT_REPOSITORY '{name}', expected one of {sorted(BACKENDS)}")
+    logger.info("Initializing the %s product repository", name)
+    if name == "sql":
+        ModProduct.initialize_db(app)
+    else:
+        configure_services(app)
+        search_index.backend = InvertedIndex()
+    product_repository.backend = BACKENDS[name]()
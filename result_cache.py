@@ -0,0 +1,146 @@
+"""
+Result-set cache
+
+Caches whole encoded listing responses, such as GET /products/category/FOOD,
+under (query kind, arguments). Every entry records the catalog version it
+was encoded at. A hit on the current version inside RESULT_CACHE_TTL
+hands back the stored bytes without a query or serialize() call.
+
+An entry that is stale, because the catalog changed or the TTL passed,
+is still served while one background refresh per key encodes it again
+(stale-while-revalidate). An entry is dropped RESULT_CACHE_STALE_TTL
+seconds after its TTL ends; the next request then encodes the result
+itself. A RESULT_CACHE_STALE_TTL of 0 turns stale serving off.
+
+    RESULT_CACHE_SIZE       listings kept, 0 turns the cache off (default 256)
+    RESULT_CACHE_TTL        seconds a listing is fresh (default 30)
+    RESULT_CACHE_STALE_TTL  seconds a stale listing may still be served (default 5)
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import copy_current_request_context, has_request_context
+from service.cache import LRUCache
+from service.catalog import catalog_version
+
+logger = logging.getLogger("flask.app")
+
+
+class CachedResult:
+    """An encoded response body with the headers that go with it"""
+
+    __slots__ = ("version", "fresh_until", "body", "headers")
+
+    def __init__(self, version: int, fresh_until: float, body: bytes, headers: dict):
+        self.version = version
+        self.fresh_until = fresh_until
+        self.body = body
+        self.headers = headers
+
+
+class ResultCache:
+    """Encoded result sets keyed by query, refreshed in the background"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 30.0, stale_ttl: float = 5.0,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self.entries = LRUCache(maxsize=maxsize, ttl=ttl + stale_ttl, clock=clock)
+        self._refreshing = set()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._executor = None
+        self.stale_hits = 0
+        self.refreshes = 0
+
+    def get(self, key, compute) -> CachedResult:
+        """Returns the cached result for key, encoding it with compute()
+
+        compute() returns a (body, headers) pair. It runs in a copy of the
+        current request context when the refresh is done in the background.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return self._compute(key, compute)
+        if entry.version == catalog_version.current and entry.fresh_until > self._clock():
+            return entry
+        if self.stale_ttl <= 0:
+            return self._compute(key, compute)
+        with self._lock:
+            self.stale_hits += 1
+        self._refresh(key, compute)
+        return entry
+
+    def _compute(self, key, compute) -> CachedResult:
+        # Read the version first, so a write made while encoding makes the
+        # result stale rather than hiding the write
+        version = catalog_version.current
+        body, headers = compute()
+        entry = CachedResult(version, self._clock() + self.ttl, body, headers)
+        self.entries.set(key, entry)
+        return entry
+
+    def _refresh(self, key, compute):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self.refreshes += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix="result-cache"
+                )
+        if has_request_context():
+            compute = copy_current_request_context(compute)
+
+        def refresh():
+            try:
+                self._compute(key, compute)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Refreshing cached result %s failed", key)
+                self.entries.delete(key)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        future = self._executor.submit(refresh)
+        with self._lock:
+            self._pending = [f for f in self._pending if not f.done()] + [future]
+
+    def wait(self):
+        """Blocks until the background refreshes started so far are done"""
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+
+    def clear(self):
+        """Drops every cached result and resets the counters"""
+        self.entries = LRUCache(
+            maxsize=self.entries.maxsize, ttl=self.ttl + self.stale_ttl, clock=self._clock
+        )
+        with self._lock:
+            self.stale_hits = 0
+            self.refreshes = 0
+
+    def stats(self) -> dict:
+        """Returns the entry counters plus stale hits and refreshes"""
+        stats = self.entries.stats()
+        with self._lock:
+            stats.update(stale_hits=self.stale_hits, refreshes=self.refreshes)
+        return stats
+
+
+# The result cache used by the listing routes, sized later by configure_result_cache()
+result_cache = ResultCache()
+
+
+def configure_result_cache(app):
+    """Sizes the result cache from the app configuration"""
+    result_cache.ttl = app.config.get("RESULT_CACHE_TTL", 30.0)
+    result_cache.stale_ttl = app.config.get("RESULT_CACHE_STALE_TTL", 5.0)
+    result_cache.entries = LRUCache(
+        maxsize=app.config.get("RESULT_CACHE_SIZE", 256),
+        ttl=result_cache.ttl + result_cache.stale_ttl,
+    )
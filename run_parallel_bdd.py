@@ -0,0 +1,184 @@
+"""
+Parallel behave runner
+
+Shards the scenarios of the feature files across N workers. Every worker
+starts its own copy of the service on its own port and database, runs its
+share of scenarios against it with behave, and writes a JSON report; the
+reports are then merged into one. Because each worker owns its catalog,
+the Background reset of one scenario can no longer clobber another.
+
+    python run_parallel_bdd.py --workers 4 features
+
+``{port}`` and ``{worker}`` in --service-cmd and --database-uri are
+replaced per worker, e.g. a PostgreSQL schema per worker:
+
+    --database-uri "postgresql://.../postgres?options=-csearch_path%3Dworker_{worker}"
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIO_KEYWORDS = ("Scenario:", "Scenario Outline:", "Scenario Template:")
+
+
+def discover_scenarios(paths: list) -> list:
+    """Returns a ``file:line`` location for every scenario in the features"""
+    locations = []
+    for path in paths:
+        path = Path(path)
+        files = sorted(path.rglob("*.feature")) if path.is_dir() else [path]
+        for feature in files:
+            lines = feature.read_text(encoding="utf-8").splitlines()
+            for number, line in enumerate(lines, start=1):
+                if line.strip().startswith(SCENARIO_KEYWORDS):
+                    locations.append(f"{feature}:{number}")
+    return locations
+
+
+def shard(locations: list, workers: int) -> list:
+    """Deals scenarios round-robin so every worker gets a similar share"""
+    shards = [locations[index::workers] for index in range(workers)]
+    return [locations for locations in shards if locations]
+
+
+def wait_until_up(base_url: str, timeout: float):
+    """Polls the service until it answers or the timeout expires"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(base_url, timeout=1):
+                return
+        except urllib.error.HTTPError:
+            return  # the service is up, it just has no page at /
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Service at {base_url} did not start") from None
+            time.sleep(0.2)
+
+
+def run_worker(worker: int, locations: list, args, workdir: str) -> dict:
+    """Runs one shard of scenarios against a private service instance"""
+    port = args.base_port + worker
+    base_url = f"http://127.0.0.1:{port}"
+    fields = {"port": port, "worker": worker, "workdir": workdir}
+    env = dict(os.environ)
+    env["PORT"] = str(port)
+    env["DATABASE_URI"] = args.database_uri.format(**fields)
+    env["BASE_URL"] = base_url
+
+    service = subprocess.Popen(
+        shlex.split(args.service_cmd.format(**fields)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    report = os.path.join(workdir, f"worker-{worker}.json")
+    start = time.perf_counter()
+    command = [
+        "behave", "--no-capture",
+        "--format", "json", "--outfile", report,
+        "--format", "progress",
+        *locations,
+    ]
+    try:
+        wait_until_up(base_url, args.startup_timeout)
+        completed = subprocess.run(
+            command,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            check=False,
+        )
+        returncode, output = completed.returncode, completed.stdout
+    except RuntimeError as error:
+        returncode, output = 1, str(error)
+    finally:
+        service.terminate()
+        service.wait(timeout=10)
+    return {
+        "worker": worker,
+        "returncode": returncode,
+        "output": output,
+        "report": report,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def merge_reports(reports: list) -> list:
+    """Merges behave JSON reports into one, one entry per feature file"""
+    features = {}
+    for report in reports:
+        if not os.path.exists(report):
+            continue
+        with open(report, encoding="utf-8") as handle:
+            for feature in json.load(handle):
+                merged = features.setdefault(feature["location"].split(":")[0], feature)
+                if merged is not feature:
+                    merged["elements"].extend(feature.get("elements", []))
+    for feature in features.values():
+        elements = feature.setdefault("elements", [])
+        elements.sort(key=lambda element: int(element["location"].split(":")[-1]))
+        statuses = {element.get("status") for element in elements}
+        feature["status"] = "failed" if "failed" in statuses else "passed"
+    return [features[path] for path in sorted(features)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("paths", nargs="*", default=["features"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--base-port", type=int, default=8100)
+    parser.add_argument(
+        "--service-cmd",
+        default="gunicorn --bind 127.0.0.1:{port} --log-level=warning service:app",
+    )
+    parser.add_argument(
+        "--database-uri", default="sqlite:///{workdir}/worker-{worker}.db"
+    )
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    parser.add_argument("--report", default="behave-report.json")
+    args = parser.parse_args()
+
+    locations = discover_scenarios(args.paths)
+    shards = shard(locations, args.workers)
+    print(f"Running {len(locations)} scenarios on {len(shards)} workers")
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="bdd-") as workdir:
+        with ThreadPoolExecutor(max_workers=len(shards) or 1) as executor:
+            jobs = [
+                executor.submit(run_worker, worker, locations, args, workdir)
+                for worker, locations in enumerate(shards)
+            ]
+            results = [job.result() for job in jobs]
+        merged = merge_reports([result["report"] for result in results])
+
+    with open(args.report, "w", encoding="utf-8") as handle:
+        json.dump(merged, handle, indent=2)
+
+    failed = 0
+    for result in results:
+        print(
+            f"--- worker {result['worker']} "
+            f"({result['seconds']:.1f}s, exit {result['returncode']})"
+        )
+        print(result["output"].rstrip())
+        failed += result["returncode"] != 0
+    print(f"Wall time {time.perf_counter() - start:.1f}s, report written to {args.report}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
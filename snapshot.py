@@ -0,0 +1,414 @@
+"""
+Columnar catalog snapshots
+
+A snapshot holds the whole catalog column by column in one little-endian
+file, so analytics can memory-map it instead of pulling and re-parsing
+the JSON of GET /products:
+
+    id, version        int64
+    cost               int64, the cost times 10 ** cost_scale
+    available          bitmap, one bit per product (LSB first)
+    category           uint8, the ProductCategory value
+    title, details     int64 offsets (one more than there are products)
+                       into a UTF-8 heap
+    sku, content_hash, idempotency_key
+                       the same, plus a bitmap of the rows that are not null
+    idempotency_expires
+                       int64 microseconds since 1970-01-01 UTC, plus a
+                       bitmap of the rows that are not null
+
+Every column starts on an 8-byte boundary. Snapshot maps the file and
+hands out memoryviews of it; Snapshot.arrays() wraps the same memory in
+NumPy arrays when NumPy is installed, without copying. restore_snapshot()
+bulk-loads a snapshot into the database, keeping the product ids.
+
+    python -m service.snapshot export catalog.snap
+    python -m service.snapshot restore catalog.snap --replace
+"""
+import os
+import sys
+import mmap
+import struct
+import argparse
+from array import array
+from decimal import Decimal
+from datetime import datetime, timedelta
+from collections import namedtuple
+from sqlalchemy import delete, insert, text
+from service.cache import product_cache
+from service.catalog import catalog_version
+from service.encoders import PRODUCT_COLUMNS
+from service.fulltext import search_index
+from service.models import db, DataValidationError, ModProduct, ProductCategory
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - NumPy is optional
+    numpy = None
+
+MAGIC = b"MODSNAP2"
+FORMAT_VERSION = 2
+# magic, format version, cost scale, product count, column count
+HEADER = struct.Struct("<8sIIQI")
+# column name, element type, offset, length in bytes
+DIRECTORY_ENTRY = struct.Struct("<32s4sQQ")
+ALIGNMENT = 8
+
+# Columns every snapshot holds, in file order
+COLUMNS = (
+    "id", "version", "cost", "available", "category",
+    "title.offsets", "title.heap", "details.offsets", "details.heap",
+    "sku.offsets", "sku.heap", "sku.valid",
+    "content_hash.offsets", "content_hash.heap", "content_hash.valid",
+    "idempotency_key.offsets", "idempotency_key.heap", "idempotency_key.valid",
+    "idempotency_expires", "idempotency_expires.valid",
+)
+
+# What a snapshot stores of each product: the serialized columns plus
+# the ones catalog sync and idempotent creates rely on
+SNAPSHOT_COLUMNS = PRODUCT_COLUMNS + (
+    ModProduct.sku,
+    ModProduct.content_hash,
+    ModProduct.idempotency_key,
+    ModProduct.idempotency_expires,
+)
+NULLABLE_STRINGS = ("sku", "content_hash", "idempotency_key")
+
+# Element types, as NumPy spells them
+INT64 = "<i8"
+UINT8 = "|u1"
+
+SnapshotRow = namedtuple(
+    "SnapshotRow",
+    ["id", "title", "details", "cost", "available", "category", "version",
+     "sku", "content_hash", "idempotency_key", "idempotency_expires"],
+)
+
+_CATEGORIES = {category.value: category for category in ProductCategory}
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class SnapshotError(Exception):
+    """Used for files that are not valid snapshots"""
+
+
+def _int64(values) -> bytes:
+    data = array("q", values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _heap(strings: list) -> tuple:
+    offsets = [0]
+    heap = bytearray()
+    for string in strings:
+        if string is not None:
+            heap += string.encode("utf-8")
+        offsets.append(len(heap))
+    return _int64(offsets), bytes(heap)
+
+
+def _bitmap(flags: list) -> bytes:
+    bitmap = bytearray((len(flags) + 7) // 8)
+    for position, flag in enumerate(flags):
+        if flag:
+            bitmap[position >> 3] |= 1 << (position & 7)
+    return bytes(bitmap)
+
+
+def write_snapshot(stream, rows) -> int:
+    """Writes rows of the SNAPSHOT_COLUMNS to a binary stream
+
+    Returns the number of products written. The cost scale is the largest
+    number of decimal places of any cost, so every cost is stored exactly.
+    """
+    ids, versions, costs, flags, categories, titles, details = [], [], [], [], [], [], []
+    nullable = {name: [] for name in NULLABLE_STRINGS}
+    expires = []
+    for row in rows:
+        ids.append(row[0])
+        titles.append(row[1])
+        details.append(row[2])
+        costs.append(Decimal(row[3]))
+        flags.append(bool(row[4]))
+        categories.append(row[5].value)
+        versions.append(row[6])
+        for name, value in zip(NULLABLE_STRINGS, row[7:10]):
+            nullable[name].append(value)
+        expires.append(row[10])
+    count = len(ids)
+
+    scale = max([max(-cost.as_tuple().exponent, 0) for cost in costs] or [0])
+    scaled = []
+    for cost in costs:
+        value = int(cost.scaleb(scale))
+        if not -2 ** 63 <= value < 2 ** 63:
+            raise DataValidationError(f"Cost {cost} does not fit a snapshot")
+        scaled.append(value)
+    title_offsets, title_heap = _heap(titles)
+    details_offsets, details_heap = _heap(details)
+
+    columns = [
+        ("id", INT64, _int64(ids)),
+        ("version", INT64, _int64(versions)),
+        ("cost", INT64, _int64(scaled)),
+        ("available", UINT8, _bitmap(flags)),
+        ("category", UINT8, bytes(categories)),
+        ("title.offsets", INT64, title_offsets),
+        ("title.heap", UINT8, title_heap),
+        ("details.offsets", INT64, details_offsets),
+        ("details.heap", UINT8, details_heap),
+    ]
+    for name, strings in nullable.items():
+        offsets, heap = _heap(strings)
+        columns += [
+            (name + ".offsets", INT64, offsets),
+            (name + ".heap", UINT8, heap),
+            (name + ".valid", UINT8, _bitmap([value is not None for value in strings])),
+        ]
+    columns += [
+        ("idempotency_expires", INT64, _int64(
+            0 if value is None else (value - _EPOCH) // _MICROSECOND for value in expires
+        )),
+        ("idempotency_expires.valid", UINT8, _bitmap([value is not None for value in expires])),
+    ]
+    offset = _align(HEADER.size + DIRECTORY_ENTRY.size * len(columns))
+    directory = []
+    for name, kind, data in columns:
+        directory.append(DIRECTORY_ENTRY.pack(name.encode("ascii"), kind.encode("ascii"),
+                                              offset, len(data)))
+        offset = _align(offset + len(data))
+
+    written = stream.write(HEADER.pack(MAGIC, FORMAT_VERSION, scale, count, len(columns)))
+    written += stream.write(b"".join(directory))
+    for _, _, data in columns:
+        written += stream.write(b"\0" * (_align(written) - written))
+        written += stream.write(data)
+    return count
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class Snapshot:
+    """A memory-mapped snapshot file
+
+    The memoryviews and arrays it hands out point into the mapping; drop
+    them before calling close().
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as handle:
+            try:
+                self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as error:
+                raise SnapshotError(f"{path} is empty") from error
+        try:
+            self.columns = self._read_directory()
+        except (struct.error, SnapshotError) as error:
+            self._mmap.close()
+            raise SnapshotError(f"{path} is not a valid snapshot: {error}") from error
+
+    def _read_directory(self) -> dict:
+        magic, version, self.cost_scale, self.count, count = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise SnapshotError(f"expected a version {FORMAT_VERSION} snapshot")
+        columns = {}
+        for index in range(count):
+            name, kind, offset, length = DIRECTORY_ENTRY.unpack_from(
+                self._mmap, HEADER.size + index * DIRECTORY_ENTRY.size
+            )
+            if offset + length > len(self._mmap):
+                raise SnapshotError("the file is truncated")
+            columns[name.rstrip(b"\0").decode("ascii")] = (
+                kind.rstrip(b"\0").decode("ascii"), offset, length
+            )
+        missing = [name for name in COLUMNS if name not in columns]
+        if missing:
+            raise SnapshotError("missing columns " + ", ".join(missing))
+        return columns
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmaps the file"""
+        self._mmap.close()
+
+    def column(self, name: str):
+        """Returns a column as a memoryview of int64 or uint8 items"""
+        kind, offset, length = self.columns[name]
+        view = memoryview(self._mmap)[offset:offset + length]
+        if kind != INT64:
+            return view
+        if sys.byteorder == "little":
+            return view.cast("q")
+        data = array("q", view)
+        data.byteswap()
+        return memoryview(data)
+
+    def strings(self, name: str) -> list:
+        """Decodes the strings of a string column, None where it is null"""
+        offsets = self.column(name + ".offsets")
+        heap = self.column(name + ".heap")
+        strings = [
+            str(heap[offsets[index]:offsets[index + 1]], "utf-8")
+            for index in range(self.count)
+        ]
+        if name + ".valid" not in self.columns:
+            return strings
+        return [
+            string if valid else None
+            for string, valid in zip(strings, self._flags(name + ".valid"))
+        ]
+
+    def costs(self) -> list:
+        """Returns the costs as Decimals"""
+        return [Decimal(value).scaleb(-self.cost_scale) for value in self.column("cost")]
+
+    def available(self) -> list:
+        """Returns the availability flags"""
+        return self._flags("available")
+
+    def timestamps(self, name: str) -> list:
+        """Returns a timestamp column as UTC datetimes, None where it is null"""
+        return [
+            _EPOCH + value * _MICROSECOND if valid else None
+            for value, valid in zip(self.column(name), self._flags(name + ".valid"))
+        ]
+
+    def _flags(self, name: str) -> list:
+        bitmap = self.column(name)
+        return [bool(bitmap[index >> 3] >> (index & 7) & 1) for index in range(self.count)]
+
+    def arrays(self) -> dict:
+        """Returns every column as a NumPy array over the mapped file
+
+        Numeric columns are views of the file, not copies. ``available`` and
+        the ``.valid`` null bitmaps are unpacked into bool arrays.
+        """
+        if numpy is None:
+            raise RuntimeError("NumPy is required for Snapshot.arrays()")
+        arrays = {}
+        for name, (kind, offset, length) in self.columns.items():
+            dtype = numpy.dtype(kind)
+            arrays[name] = numpy.frombuffer(
+                self._mmap, dtype=dtype, count=length // dtype.itemsize, offset=offset
+            )
+        for name in arrays:
+            if name == "available" or name.endswith(".valid"):
+                arrays[name] = numpy.unpackbits(
+                    arrays[name], bitorder="little"
+                )[:self.count].astype(bool)
+        return arrays
+
+    def rows(self):
+        """Yields every product as a SnapshotRow"""
+        columns = zip(
+            self.column("id"),
+            self.strings("title"),
+            self.strings("details"),
+            self.costs(),
+            self.available(),
+            self.column("category"),
+            self.column("version"),
+            *(self.strings(name) for name in NULLABLE_STRINGS),
+            self.timestamps("idempotency_expires"),
+        )
+        for row in columns:
+            yield SnapshotRow(*row[:5], _CATEGORIES[row[5]], *row[6:])
+
+
+def export_snapshot(stream, batch_size: int = 1000) -> int:
+    """Writes the whole catalog to a binary stream, in id order"""
+    query = (
+        ModProduct.query.with_entities(*SNAPSHOT_COLUMNS)
+        .order_by(ModProduct.id)
+        .yield_per(batch_size)
+    )
+    return write_snapshot(stream, query)
+
+
+def restore_snapshot(path: str, chunk_size: int = 10000, replace: bool = False) -> int:
+    """Loads a snapshot into the database and returns the products loaded
+
+    The file is validated before anything is written. Rows are then
+    inserted with executemany INSERTs of chunk_size rows in one
+    transaction, keeping their ids. With replace the catalog is emptied
+    in the same transaction, so a snapshot that fails to load leaves it
+    as it was; otherwise the ids must not exist yet.
+    """
+    table = ModProduct.__table__
+    count = 0
+    with Snapshot(path) as snapshot:
+        rows = []
+        try:
+            if replace:
+                db.session.execute(delete(table))
+            for row in snapshot.rows():
+                rows.append(row)
+                if len(rows) >= chunk_size:
+                    db.session.execute(insert(table), [row._asdict() for row in rows])
+                    count += len(rows)
+                    rows = []
+            if rows:
+                db.session.execute(insert(table), [row._asdict() for row in rows])
+                count += len(rows)
+            _reset_id_sequence()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        catalog_version.bump()
+        product_cache.clear()
+        if replace:
+            search_index.clear()
+        for row in snapshot.rows():
+            search_index.add(row)
+    return count
+
+
+def _reset_id_sequence():
+    """Moves PostgreSQL's id sequence past the restored ids"""
+    if db.session.get_bind().dialect.name != "postgresql":
+        return
+    table = ModProduct.__tablename__
+    db.session.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM {table}), 1))"
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or restore a catalog snapshot")
+    parser.add_argument("command", choices=["export", "restore"])
+    parser.add_argument("path")
+    parser.add_argument("--replace", action="store_true", help="empty the catalog first")
+    args = parser.parse_args()
+
+    from service import app  # pylint: disable=import-outside-toplevel
+    from service.models import initialize_db  # pylint: disable=import-outside-toplevel
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
+        "DATABASE_URI", app.config.get("SQLALCHEMY_DATABASE_URI")
+    )
+    initialize_db(app)
+    if args.command == "export":
+        with open(args.path, "wb") as stream:
+            count = export_snapshot(stream)
+    else:
+        count = restore_snapshot(args.path, replace=args.replace)
+    print(f"{args.command}: {count} products")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Streaming product listings
+
+Large exports are written to the client row by row instead of being built
+as one list of ORM objects, one list of dicts and one JSON string. Rows are
+read with yield_per(), which uses a server-side cursor where the driver
+supports one, so peak memory stays flat regardless of table size.
+"""
+from flask import Response, current_app, stream_with_context
+from service.encoders import project, row_encoder, use_row_encoder
+from service.models import ModProduct
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+JSON_MIMETYPE = "application/json"
+
+
+def stream_mode(request) -> str:
+    """Returns "ndjson", "array" or None for a listing request
+
+    NDJSON is chosen through the Accept header. A chunked JSON array is
+    chosen with the ``stream`` query parameter, so clients that only
+    understand JSON can still export the full catalog.
+    """
+    best = request.accept_mimetypes.best_match([JSON_MIMETYPE, NDJSON_MIMETYPE])
+    if best == NDJSON_MIMETYPE:
+        return "ndjson"
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return "array"
+    return None
+
+
+def _encoded_products(query, batch_size: int):
+    """Yields the JSON of each product of a query in id order
+
+    Rows are read batch_size at a time and, when the app's JSON settings
+    allow it, encoded straight from the selected columns. A list of
+    products, as the memory repository returns, is encoded as it is.
+    """
+    if isinstance(query, list):
+        dumps = current_app.json.dumps
+        for product in query:
+            yield dumps(product.serialize())
+        return
+    query = query.order_by(ModProduct.id)
+    if use_row_encoder(current_app):
+        encode_row = row_encoder(current_app)
+        for row in project(query).yield_per(batch_size):
+            yield encode_row(row)
+    else:
+        dumps = current_app.json.dumps
+        for product in query.yield_per(batch_size):
+            yield dumps(product.serialize())
+
+
+def ndjson_rows(query, batch_size: int):
+    """Yields one serialized product per line"""
+    for product in _encoded_products(query, batch_size):
+        yield product + "\n"
+
+
+def json_array_rows(query, batch_size: int):
+    """Yields a JSON array one element at a time"""
+    separator = "["
+    for product in _encoded_products(query, batch_size):
+        yield separator + product
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+def stream_response(query, mode: str) -> Response:
+    """Returns a generator-backed response for the given stream mode"""
+    batch_size = current_app.config.get("STREAM_BATCH_SIZE", 1000)
+    if mode == "ndjson":
+        rows, mimetype = ndjson_rows(query, batch_size), NDJSON_MIMETYPE
+    else:
+        rows, mimetype = json_array_rows(query, batch_size), JSON_MIMETYPE
+    return Response(stream_with_context(rows), mimetype=mimetype)
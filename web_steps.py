@@ -1,16 +1,144 @@
 import logging
 from behave import when, then
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select, WebDriverWait
 from selenium.webdriver.support import expected_conditions
 
 ID_PREFIX = 'product_'
 
+# Reads the value of several fields in one round trip; a <select> reports
+# the text of its selected option like Select.first_selected_option does
+READ_FIELDS_SCRIPT = """
+return arguments[0].map(function (id) {
+    var element = document.getElementById(id);
+    if (element === null) { return null; }
+    if (element.tagName === 'SELECT') {
+        var option = element.options[element.selectedIndex];
+        return option ? option.text : '';
+    }
+    return element.value;
+});
+"""
+
+# The elements the app writes its messages and search results into; text
+# checks read only these instead of the whole body
+TEXT_ELEMENT_IDS = ['flash_message', 'search_results']
+
+# Tells in one round trip whether any of the given elements shows the text
+SHOWS_TEXT_SCRIPT = """
+return arguments[1].some(function (id) {
+    var element = document.getElementById(id);
+    return element !== null && element.textContent.indexOf(arguments[0]) !== -1;
+}, arguments[0]);
+"""
+
+
+class ProductAdminPage:
+    """ Page object for the product administration page
+
+    Elements are looked up once and reused until the page replaces them,
+    several fields are read with a single script call, and text checks wait
+    on the element that shows the text instead of reading the whole body.
+    """
+
+    def __init__(self, driver, wait_seconds):
+        self.driver = driver
+        self.wait_seconds = wait_seconds
+        self._elements = {}
+
+    @staticmethod
+    def field_id(element_name):
+        """ Maps a field label to its element id """
+        return ID_PREFIX + element_name.lower().replace(' ', '_')
+
+    def wait(self):
+        """ Returns a wait bound to the configured timeout """
+        return WebDriverWait(self.driver, self.wait_seconds)
+
+    def visit(self, url):
+        """ Loads a page, which invalidates every cached element """
+        self._elements.clear()
+        self.driver.get(url)
+
+    def _resolve(self, element_id):
+        element = self._elements.get(element_id)
+        if element is None:
+            element = self.wait().until(
+                expected_conditions.presence_of_element_located((By.ID, element_id))
+            )
+            self._elements[element_id] = element
+        return element
+
+    def with_element(self, element_id, action):
+        """ Runs action on an element, looking it up again if it went stale """
+        try:
+            return action(self._resolve(element_id))
+        except StaleElementReferenceException:
+            self._elements.pop(element_id, None)
+            return action(self._resolve(element_id))
+
+    def set_field(self, element_name, text_string):
+        """ Replaces the text of an input field """
+        def action(element):
+            element.clear()
+            element.send_keys(text_string)
+        self.with_element(self.field_id(element_name), action)
+
+    def field_value(self, element_name):
+        """ Returns the value of an input field """
+        return self.with_element(
+            self.field_id(element_name), lambda element: element.get_attribute('value')
+        )
+
+    def select(self, element_name, text):
+        """ Chooses an option of a dropdown by its text """
+        self.with_element(
+            self.field_id(element_name),
+            lambda element: Select(element).select_by_visible_text(text)
+        )
+
+    def click(self, button_name):
+        """ Clicks a button by its label """
+        self.with_element(button_name.lower() + '-btn', lambda element: element.click())
+
+    def read_fields(self, element_names):
+        """ Returns the values of several fields with one script call """
+        ids = [self.field_id(name) for name in element_names]
+        return dict(zip(element_names, self.driver.execute_script(READ_FIELDS_SCRIPT, ids)))
+
+    def wait_for_fields(self, expected):
+        """ Waits until every field holds its expected value """
+        names = list(expected)
+        try:
+            self.wait().until(lambda driver: self.read_fields(names) == expected)
+        except TimeoutException:
+            actual = self.read_fields(names)
+            assert(actual == expected), f'Expected {expected}, found {actual}'
+
+    def shows(self, text_string):
+        """ Tells whether the message or results element shows some text """
+        return self.driver.execute_script(SHOWS_TEXT_SCRIPT, text_string, TEXT_ELEMENT_IDS)
+
+    def wait_for_text(self, element_id, text_string):
+        """ Waits for text to appear in one element """
+        return self.wait().until(
+            expected_conditions.text_to_be_present_in_element((By.ID, element_id), text_string)
+        )
+
+
+def get_page(context):
+    """ Returns the page object of the current scenario """
+    page = getattr(context, 'page', None)
+    if page is None:
+        page = context.page = ProductAdminPage(context.driver, context.wait_seconds)
+    return page
+
 
 @when('I visit the "Home Page"')
 def step_impl(context):
     """ Make a call to the base URL """
-    context.driver.get(context.base_url)
+    get_page(context).visit(context.base_url)
     # Uncomment next line to take a screenshot of the web page
     # context.driver.save_screenshot('home_page.png')
 
@@ -21,85 +149,76 @@ def step_impl(context, message):
 
 @then('I should not see "{text_string}"')
 def step_impl(context, text_string):
-    element = context.driver.find_element(By.TAG_NAME, 'body')
-    assert(text_string not in element.text)
+    assert(not get_page(context).shows(text_string))
 
 @when('I set the "{element_name}" to "{text_string}"')
 def step_impl(context, element_name, text_string):
-    element_id = ID_PREFIX + element_name.lower().replace(' ', '_')
-    element = context.driver.find_element(By.ID, element_id)
-    element.clear()
-    element.send_keys(text_string)
+    get_page(context).set_field(element_name, text_string)
 
 @when('I select "{text}" in the "{element_name}" dropdown')
 def step_impl(context, text, element_name):
-    element_id = ID_PREFIX + element_name.lower().replace(' ', '_')
-    element = Select(context.driver.find_element(By.ID, element_id))
-    element.select_by_visible_text(text)
+    get_page(context).select(element_name, text)
 
 @then('I should see "{text}" in the "{element_name}" dropdown')
 def step_impl(context, text, element_name):
-    element_id = ID_PREFIX + element_name.lower().replace(' ', '_')
-    element = Select(context.driver.find_element(By.ID, element_id))
-    assert(element.first_selected_option.text == text)
+    get_page(context).wait_for_fields({element_name: text})
 
 @then('the "{element_name}" field should be empty')
 def step_impl(context, element_name):
-    element_id = ID_PREFIX + element_name.lower().replace(' ', '_')
-    element = context.driver.find_element(By.ID, element_id)
-    assert(element.get_attribute('value') == u'')
+    get_page(context).wait_for_fields({element_name: u''})
+
+@then('the following fields should be empty')
+def step_impl(context):
+    """ Check several fields with a single round trip """
+    get_page(context).wait_for_fields({row['field']: u'' for row in context.table})
+
+@then('I should see the following field values')
+def step_impl(context):
+    """ Check several fields with a single round trip """
+    get_page(context).wait_for_fields({row['field']: row['value'] for row in context.table})
 
 ##################################################################
 # These two function simulate copy and paste
 ##################################################################
 @when('I copy the "{element_name}" field')
 def step_impl(context, element_name):
-    element_id = ID_PREFIX + element_name.lower().replace(' ', '_')
-    element = WebDriverWait(context.driver, context.wait_seconds).until(
-        expected_conditions.presence_of_element_located((By.ID, element_id))
-    )
-    context.clipboard = element.get_attribute('value')
+    context.clipboard = get_page(context).field_value(element_name)
     logging.info('Clipboard contains: %s', context.clipboard)
 
 @when('I paste the "{element_name}" field')
 def step_impl(context, element_name):
-    element_id = ID_PREFIX + element_name.lower().replace(' ', '_')
-    element = WebDriverWait(context.driver, context.wait_seconds).until(
-        expected_conditions.presence_of_element_located((By.ID, element_id))
-    )
-    element.clear()
-    element.send_keys(context.clipboard)
+    get_page(context).set_field(element_name, context.clipboard)
 
 @when('I click the "{button_name}" button')
 def step_impl(context, button_name):
-    button_id = button_name.lower() + '-btn'
-    element = WebDriverWait(context.driver, context.wait_seconds).until(
-        expected_conditions.presence_of_element_located((By.ID, button_id))
-    )
-    element.click()
+    get_page(context).click(button_name)
+
+@when('I press the "{button_name}" button')
+def step_impl(context, button_name):
+    get_page(context).click(button_name)
+
 @then('I should see "{text_string}"')
 def step_impl(context, text_string):
-    element = WebDriverWait(context.driver, context.wait_seconds).until(
-        expected_conditions.presence_of_element_located((By.CSS_SELECTOR, f'*{text_string}*'))
-    )
-    assert(element is not None)
-@then('I should not see "{text_string}"')
-def step_impl(context, text_string):
-    element = WebDriverWait(context.driver, context.wait_seconds).until(
-        expected_conditions.presence_of_element_located((By.CSS_SELECTOR, f'*{text_string}*'))
-    )
-    assert(element is None)
+    assert(get_page(context).wait_for_text('flash_message', text_string))
+
+@then('I should see the message "{message}"')
+def step_impl(context, message):
+    assert(get_page(context).wait_for_text('flash_message', message))
+
+@then('I should see "{name}" in the results')
+def step_impl(context, name):
+    assert(get_page(context).wait_for_text('search_results', name))
+
 @then('I should see the following message:')
 def step_impl(context):
     expected_message = context.text
-    actual_message = context.driver.find_element(By.TAG_NAME, 'body').text
-    assert(expected_message in actual_message)
+    assert(get_page(context).wait_for_text('flash_message', expected_message))
 
 
 @then('I should see "{text_string}" in the "{element_name}" field')
 def step_impl(context, text_string, element_name):
-    element_id = ID_PREFIX + element_name.lower().replace(' ', '_')
-    found = WebDriverWait(context.driver, context.wait_seconds).until(
+    element_id = ProductAdminPage.field_id(element_name)
+    found = get_page(context).wait().until(
         expected_conditions.text_to_be_present_in_element_value(
             (By.ID, element_id),
             text_string
@@ -109,9 +228,4 @@ def step_impl(context, text_string, element_name):
 
 @when('I change "{element_name}" to "{text_string}"')
 def step_impl(context, element_name, text_string):
-    element_id = ID_PREFIX + element_name.lower().replace(' ', '_')
-    element = WebDriverWait(context.driver, context.wait_seconds).until(
-        expected_conditions.presence_of_element_located((By.ID, element_id))
-    )
-    element.clear()
-    element.send_keys(text_string)
\ No newline at end of file
+    get_page(context).set_field(element_name, text_string)